@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import deque
+
+
+
+################################################################################
+class BatchQueue:
+    """ Thread-safe FIFO of batches, bounded by bytes rather than items.
+
+    put() blocks while the queued batches already hold 'maxbytes' or more
+    (an empty queue always takes a batch, so a single batch over the mark
+    cannot deadlock).  The bytes of a batch are released by get(), so the
+    mark bounds what is waiting, not what consumers are working on.  One
+    lock round trip per batch instead of per item is the point; see
+    queue.Queue for the per-item version.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, maxbytes=256*1024*1024):
+        self.maxbytes = maxbytes
+        self.batches  = deque()
+        self.nbytes   = 0
+        self.cond     = threading.Condition()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def put(self, batch, nbytes=0):
+        with self.cond:
+            while self.batches and self.nbytes + nbytes > self.maxbytes:
+                self.cond.wait()
+            self.batches.append((batch, nbytes))
+            self.nbytes += nbytes
+            self.cond.notify_all()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def get(self):
+        with self.cond:
+            while not self.batches:
+                self.cond.wait()
+            batch, nbytes = self.batches.popleft()
+            self.nbytes -= nbytes
+            self.cond.notify_all()
+        return batch
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def qbytes(self):
+        with self.cond:
+            return self.nbytes
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import os, sys, re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import time
+
+# tree walkers we know how to drive, relative to this directory.  'cwd'
+# tools walk '.' and so are started inside the tree
+tools = { 'walktree'   : ('walktree/run.py', 'arg'),
+          'dispatch'   : ('dispatch/run.py', 'arg'),
+          'workthief'  : ('workthief.py',    'cwd'),
+          'workthief2' : ('workthief2.py',   'arg'),
+          'echo'       : ('echo.py',         'arg'),
+          'tar'        : ('tar.py',          'arg') }
+
+totals_re    = [ re.compile(r"Total found \d+ objects = (\d+) files \+ (\d+) dirs"),
+                 re.compile(r"Total found (\d+) files, (\d+) dirs") ]
+telemetry_re = re.compile(r"t=\s*([\d.]+)s files (\d+) .* dirs (\d+),")
+
+
+
+################################################################################
+def tree_bytes(top):
+    """ total size of regular files under 'top' """
+    total = 0
+    dirs = [top]
+    while dirs:
+        for di in os.scandir(dirs.pop()):
+            if di.is_dir(follow_symlinks=False): dirs.append(di.path)
+            elif di.is_file(follow_symlinks=False): total += di.stat(follow_symlinks=False).st_size
+    return total
+
+
+
+################################################################################
+def tail_time(telemetry_file, fraction=0.95):
+    """ seconds between reaching 'fraction' of the final entry count and
+    the end of the run, from the rank-0 telemetry log """
+    samples = []
+    if os.path.exists(telemetry_file):
+        with open(telemetry_file) as f:
+            for line in f:
+                m = telemetry_re.search(line)
+                if m: samples.append((float(m.group(1)), int(m.group(2)) + int(m.group(3))))
+    if not samples: return None
+    tend, nend = samples[-1]
+    for t,n in samples:
+        if n >= fraction*nend: return tend - t
+    return None
+
+
+
+################################################################################
+def drop_caches():
+    """ flush dirty data and drop the page, dentry & inode caches, so each
+    run starts cold (root only, Linux) """
+    os.sync()
+    try:
+        with open('/proc/sys/vm/drop_caches', 'w') as f: f.write('3\n')
+    except OSError as e:
+        print("cannot drop caches: {}".format(e))
+    return
+
+
+
+################################################################################
+def parse_variant(spec):
+    """ 'name' or 'name:KEY=VALUE[,KEY=VALUE...]' -> (name, {KEY : VALUE}) """
+    name, _, settings = spec.partition(':')
+    return name, dict(kv.split('=', 1) for kv in settings.split(',') if kv)
+
+
+
+################################################################################
+def open_csv(path, fields):
+    """ 'path' opened to append rows of 'fields', with a header if new.  a
+    file from an older version, with some of the columns, is first
+    rewritten with all of them (the new ones empty); one with columns
+    we do not know is refused """
+    header = None
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            header = reader.fieldnames
+            if header and list(header) != list(fields):
+                if not set(header) <= set(fields):
+                    sys.exit("{}: columns {} do not match {}, use another --csv".format(
+                        path, ','.join(header), ','.join(fields)))
+                rows = list(reader)
+                with open(path + ".tmp", 'w', newline='') as out:
+                    writer = csv.DictWriter(out, fieldnames=fields, restval='')
+                    writer.writeheader()
+                    writer.writerows(rows)
+                os.replace(path + ".tmp", path)
+                print("{}: added columns {} to {} rows".format(
+                    path, ','.join(f for f in fields if f not in header), len(rows)))
+    out = open(path, 'a', newline='')
+    writer = csv.DictWriter(out, fieldnames=fields)
+    if not header: writer.writeheader()
+    return out, writer
+
+
+
+################################################################################
+def run_one(args, tool, nranks, tree, nbytes, variant=('', {})):
+    script, how = tools[tool]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), script)
+
+    # a scratch run directory, since the archivers write into their cwd
+    rundir = tempfile.mkdtemp(prefix="bench_{}_{}_".format(tool, nranks), dir=args.workdir)
+    telemetry_file = os.path.join(rundir, "telemetry.txt")
+    env = dict(os.environ)
+    env.update(dict(kv.split('=', 1) for kv in args.env))
+    env.update(variant[1])
+    env['TASK_RUNNER_TELEMETRY']      = str(args.telemetry)
+    env['TASK_RUNNER_TELEMETRY_FILE'] = telemetry_file
+    env['TASK_RUNNER_OUTPUT_DIR']     = rundir
+
+    cmd = shlex.split(args.mpiexec) + ["-n", str(nranks), sys.executable, script]
+    cwd = rundir
+    if how == 'arg': cmd.append(os.path.abspath(tree))
+    else:            cwd = tree
+
+    if args.drop_caches: drop_caches()
+    tstart = time.time()
+    proc = subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    wall = time.time() - tstart
+    output = proc.stdout.decode(errors='replace')
+
+    entries = None
+    for r in totals_re:
+        m = r.search(output)
+        if m:
+            entries = int(m.group(1)) + int(m.group(2))
+            break
+
+    row = { 'tool'        : tool,
+            'variant'     : variant[0],
+            'ranks'       : nranks,
+            'tree'        : tree,
+            'rc'          : proc.returncode,
+            'wall_s'      : round(wall, 4),
+            'entries'     : entries,
+            'entries_s'   : round(entries/wall, 1) if entries else None,
+            'bytes_s'     : round(nbytes/wall, 1) if proc.returncode == 0 else None,
+            'tail_s'      : tail_time(telemetry_file) }
+
+    if proc.returncode and args.verbose: print(output)
+    if not args.keep: shutil.rmtree(rundir, ignore_errors=True)
+    return row
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the tree walkers against the same trees at several rank counts.")
+    parser.add_argument("trees", nargs='+', help="trees to walk, e.g. from make_tree.py")
+    parser.add_argument("--tools",     default=",".join(tools), help="comma separated, from: %(default)s")
+    parser.add_argument("--ranks",     default="2,4", help="comma separated rank counts (default: %(default)s)")
+    parser.add_argument("--repeat",    type=int, default=1, help="runs of each configuration (default: %(default)s)")
+    parser.add_argument("--mpiexec",   default="mpiexec", help="MPI launcher command (default: %(default)s)")
+    parser.add_argument("--env",       action='append', default=[], help="KEY=VALUE added to the environment, may repeat")
+    parser.add_argument("--variant",   action='append', default=[],
+                        help="NAME[:KEY=VALUE,...] run every configuration once per variant, with its settings, "
+                             "e.g. 'adaptive:TASK_RUNNER_ADAPTIVE=1', may repeat")
+    parser.add_argument("--telemetry", type=float, default=0.25, help="telemetry interval (s) used to measure tail time (default: %(default)s)")
+    parser.add_argument("--workdir",   default=None, help="where to create scratch run directories")
+    parser.add_argument("--csv",       default="bench.csv", help="append results to this file (default: %(default)s)")
+    parser.add_argument("--keep",      action='store_true', help="keep scratch run directories")
+    parser.add_argument("--drop-caches", action='store_true', help="drop the kernel caches before each run (needs root)")
+    parser.add_argument("--verbose",   action='store_true', help="print output of failed runs")
+    args = parser.parse_args()
+
+    fields = ('tool', 'variant', 'ranks', 'tree', 'rc', 'wall_s', 'entries', 'entries_s', 'bytes_s', 'tail_s')
+    variants = [ parse_variant(v) for v in args.variant ] or [ ('', {}) ]
+    out, writer = open_csv(args.csv, fields)
+    with out:
+        print("{:12s} {:12s} {:>6s} {:>3s} {:>10s} {:>10s} {:>12s} {:>12s} {:>8s}  {}".format(*(f for f in fields if f != 'tree'), 'tree'))
+        for tree in args.trees:
+            nbytes = tree_bytes(tree)
+            for tool in args.tools.split(','):
+                for nranks in [int(n) for n in args.ranks.split(',')]:
+                    for variant in variants:
+                        for rep in range(args.repeat):
+                            row = run_one(args, tool, nranks, tree, nbytes, variant)
+                            writer.writerow(row)
+                            out.flush()
+                            print("{tool:12s} {variant:12s} {ranks:6d} {rc:3d} {wall_s:10.3f} {entries!s:>10s} {entries_s!s:>12s} "
+                                  "{bytes_s:12.4g} {tail_s!s:>8.8s}  {tree}".format(**row))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import os, sys
+import marshal
+import importlib.abc
+import importlib.machinery
+import importlib.util
+
+# number of modules installed, once install() has run
+installed = 0
+
+
+
+################################################################################
+class BundleFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """ Imports modules from an in-memory bundle of code objects, ahead of
+    the file system.  Anything not in the bundle is left to the usual
+    finders. """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, modules):
+        # name -> (origin, package search path or None, marshalled code)
+        self.modules = modules
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def find_spec(self, name, path=None, target=None):
+        if name not in self.modules: return None
+        origin, search, code = self.modules[name]
+        spec = importlib.util.spec_from_loader(name, self, origin=origin, is_package=search is not None)
+        spec.has_location = True
+        if search is not None: spec.submodule_search_locations = list(search)
+        return spec
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def exec_module(self, module):
+        origin, search, code = self.modules[module.__name__]
+        exec(marshal.loads(code), module.__dict__)
+        return
+
+
+
+################################################################################
+def collect(dirname, extra=()):
+    """ {name : (origin, search, marshalled code)} for every .py file in
+    'dirname' and for the named 'extra' modules, where those are plain
+    source modules (extension modules cannot be loaded from memory) """
+    sources = {}
+    for f in os.listdir(dirname):
+        if f.endswith('.py'):
+            sources[f[:-3]] = (os.path.join(dirname, f), None)
+    for name in extra:
+        spec = importlib.util.find_spec(name)
+        if spec and spec.origin and spec.origin.endswith('.py'):
+            sources[name] = (spec.origin, spec.submodule_search_locations)
+
+    # SourceFileLoader reuses (and refreshes) __pycache__ bytecode
+    modules = {}
+    for name, (origin, search) in sources.items():
+        code = importlib.machinery.SourceFileLoader(name, origin).get_code(name)
+        modules[name] = (origin, search, marshal.dumps(code))
+    return modules
+
+
+
+################################################################################
+def install(comm, dirname=None, extra=(), root=0):
+    """ Collective: rank 'root' reads and compiles the modules (see
+    collect(); by default those next to the running script), broadcasts
+    them, and every rank imports them from memory from then on.  Returns
+    the number of modules in the bundle. """
+    global installed
+    if installed: return installed
+    if dirname is None: dirname = os.path.dirname(os.path.abspath(sys.argv[0]))
+    modules = comm.bcast(collect(dirname, extra) if comm.Get_rank() == root else None, root=root)
+    sys.meta_path.insert(0, BundleFinder(modules))
+    installed = len(modules)
+    return installed
+
+
+
+################################################################################
+def from_env(comm):
+    """ install() when TASK_RUNNER_BUNDLE is set in the environment: '1'
+    for the script's own modules, or a comma separated list of further
+    modules to include, e.g. 'tarfile,shutil,subprocess'.  Must be called
+    by every rank, before the modules are first imported. """
+    val = os.environ.get('TASK_RUNNER_BUNDLE', '')
+    if val.lower() in ('', '0', 'no', 'off', 'false'): return 0
+    extra = [ m for m in val.split(',') if m and m.lower() not in ('1', 'yes', 'on', 'true') ]
+    return install(comm, extra=extra)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import os
+import zlib
+from collections import deque
+from functools import lru_cache
+
+suffixes = { 'gzip' : '.gz', 'zstd' : '.zst' }
+
+
+
+################################################################################
+@lru_cache(maxsize=None)
+def zstandard():
+    """ the zstandard module, or None.  imported on first use """
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+
+################################################################################
+class ChunkCompressor:
+    """ Write-only file sink compressing its input in independent chunks
+    (gzip members or zstd frames) on a thread pool.  Both codecs release the
+    GIL, so compression scales with 'workers'.  The concatenated output is
+    an ordinary .gz / .zst stream.
+
+    Chunks are cut at the first boundary() (e.g. tar member start) after
+    'chunksize' bytes have been buffered, or unconditionally at 4*chunksize,
+    and a '<name>.chunks' sidecar lists each chunk's uncompressed offset,
+    compressed offset and compressed length, so a reader can seek to any
+    chunk and decompress from there.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, fd, name, method='gzip', level=6, workers=4, chunksize=4*1024*1024):
+        from concurrent.futures import ThreadPoolExecutor
+        if method == 'zstd' and zstandard() is None:
+            raise ImportError("zstd compression needs the 'zstandard' module")
+        self.fd        = fd
+        self.method    = method
+        self.level     = level
+        self.chunksize = chunksize
+        self.maxchunk  = 4*chunksize
+        self.pool      = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = 2*workers
+        self.pending   = deque()
+        self.buf       = bytearray()
+        self.uoffset   = 0
+        self.coffset   = 0
+        self.chunks    = open(name + ".chunks", "w")
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def compress(self, data):
+        if self.method == 'zstd':
+            return zstandard().ZstdCompressor(level=self.level).compress(data)
+        z = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return z.compress(data) + z.flush()
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def write(self, data):
+        self.buf += data
+        while len(self.buf) >= self.maxchunk:
+            self.submit(self.maxchunk)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def boundary(self):
+        # a good place to start a new chunk, if we have enough buffered
+        if len(self.buf) >= self.chunksize:
+            self.submit(len(self.buf))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def submit(self, n):
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        self.pending.append((len(data), self.pool.submit(self.compress, data)))
+        while len(self.pending) > self.max_pending:
+            self.drain()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def drain(self):
+        # write the oldest chunk, in order
+        ulen, future = self.pending.popleft()
+        view = memoryview(future.result())
+        clen = len(view)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+        self.chunks.write("{}\t{}\t{}\n".format(self.uoffset, self.coffset, clen))
+        self.uoffset += ulen
+        self.coffset += clen
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def flush(self):
+        # end a chunk here, whatever is buffered, and write out every chunk
+        if self.buf: self.submit(len(self.buf))
+        while self.pending: self.drain()
+        self.chunks.flush()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        self.flush()
+        self.pool.shutdown()
+        self.chunks.close()
+        return
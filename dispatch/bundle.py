@@ -0,0 +1 @@
+../bundle.py
\ No newline at end of file
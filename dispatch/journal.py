@@ -0,0 +1 @@
+../journal.py
\ No newline at end of file
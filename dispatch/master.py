@@ -2,6 +2,8 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
+from pathcodec import PathLink
+import resume
 import os
 import time
 import subprocess
@@ -19,6 +21,16 @@ class Master(MPIClass):
         self.num_files = 0
         self.num_dirs = 0
         self.file_size = 0
+        # directories go out front coded against the last one sent to each slave
+        self.links = [PathLink() for p in range(0,self.nranks)]
+        # on restart, directories an earlier run completed (see resume.py).
+        # the slaves' rollover parts go to 'archive_targets'
+        self.completed = set()
+        if self.get_option('restart', False):
+            targets = [t for t in self.get_option('archive_targets', '.').split(':') if t] or ['.']
+            streams = [ "output-r{:03d}".format(r) for r in range(1, self.nranks) ]
+            self.completed = resume.completed_dirs(streams=streams, targets=targets)
+        self.nskipped = 0
         return
 
 
@@ -48,11 +60,20 @@ class Master(MPIClass):
                 pathname=os.path.normpath(output)
 
                 #print(pathname)
+                if pathname in self.completed:
+                    self.nskipped += 1
+                    continue
 
                 self.comm.recv(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status)
-                self.comm.send(pathname, dest=status.Get_source(), tag=self.tags['execute'])
+                self.comm.send(self.links[status.Get_source()].encode(pathname),
+                               dest=status.Get_source(), tag=self.tags['execute'])
+
+                if self.telemetry: self.telemetry.poll()
+                self.poll_log()
 
         rc = process.poll()
+        if self.completed:
+            print("  --> Skipped {} directories completed before restart".format(self.nskipped))
 
 
         # cleanup loop, send 'terminate' tag to each slave rank in
@@ -69,4 +90,6 @@ class Master(MPIClass):
         # OK, messages sent, wait for all to complete
         MPI.Request.waitall(requests)
 
+        if self.telemetry: self.telemetry.finalize()
+
         return
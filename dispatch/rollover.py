@@ -0,0 +1 @@
+../rollover.py
\ No newline at end of file
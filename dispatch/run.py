@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
 from mpi4py import MPI
+import bundle
+bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
 from master import Master
 from slave import Slave
 import os, sys, copy
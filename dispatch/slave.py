@@ -2,13 +2,13 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
-import tarfile
+from tarwriter import member_size, BLOCKSIZE
+from rollover import Rollover
+from pathcodec import PathLink
+import resume
 import os, sys, stat
 import shutil
 
-#                b       k      M      G      T
-MAXSIZE_BYTES=   2  * 1024 * 1024 * 1024 * 1024;
-
 
 ################################################################################
 class Slave(MPIClass):
@@ -18,12 +18,17 @@ class Slave(MPIClass):
         MPIClass.__init__(self)
 
 
-        self.tar = None;
-        self.tar_cnt  = 0
-        self.tar_size = 0
+        # with a journal of completed directories, to resume from on restart
+        # (see resume.py)
+        prefix = "output-r{:03d}".format(self.rank)
+        self.journal = resume.ArchiveJournal(prefix, self.get_option) if resume.enabled(self.get_option) else None
+        self.tar = Rollover(prefix, self.get_option, self.rank, journal=self.journal)
+        if self.journal and self.get_option('restart', False):
+            self.tar.resume(*self.journal.position())
         # on first call, have master print our local config. we can do this by sending
         # a note as our first 'result'
         self.result = None #" Rank {} using local directory {}".format(self.rank, self.local_rankdir)
+        self.link = PathLink()
 
         # # process options. open any files thay belong in shared run directory.
         # if "archive" in self.options:
@@ -31,28 +36,13 @@ class Slave(MPIClass):
         return
 
 
-    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def check_next_tarfile(self):
-
-        if (self.tar_size > MAXSIZE_BYTES):
-            self.tar.close()
-            self.tar_cnt += 1
-            self.tar = None
-
-        if self.tar is None:
-            self.tar = tarfile.open("output-r{:03d}-f{}.tar".format(self.rank, self.tar_cnt),
-                                    "w",
-                                    format=tarfile.PAX_FORMAT)
-            self.tar_size = 0
-        return
-
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def process_directory(self, dirname):
 
         self.num_dirs += 1
         self.st_modes['dir'] += 1
 
-        print("[{:3d}](d) {}".format(self.rank, dirname))
+        self.log(self.LOG_DEBUG, "[{:3d}](d) {}", self.rank, dirname)
 
         #-------------------------------------
         # python scandir implementation follows
@@ -63,9 +53,6 @@ class Slave(MPIClass):
 
                 statinfo = di.stat(follow_symlinks=False)
 
-                # cycle next tarfile if necessary
-                self.check_next_tarfile()
-
                 # skip subdirectores
                 # (master will find those)
                 if di.is_dir(follow_symlinks=False): continue
@@ -73,10 +60,13 @@ class Slave(MPIClass):
                 # process non-directories
                 self.process_file(pathname, statinfo)
         except:
-            print("cannot scan {}".format(dirname))
+            self.log(self.LOG_ERROR, "cannot scan {}", dirname)
 
         # add the directory object itself, to get any special permissions or ACLs
-        if self.tar: self.tar.add(dirname, recursive=False)
+        # (the archive part rolls over first if this would overfill it)
+        tar = self.tar.writer(BLOCKSIZE)
+        tar.add(dirname)
+        if self.journal: self.journal.completed(dirname, tar)
 
         return
 
@@ -88,7 +78,6 @@ class Slave(MPIClass):
         self.num_files += 1
 
         self.file_size += statinfo.st_size
-        self.tar_size  += statinfo.st_size
 
         # decode file type
         fmode = statinfo.st_mode
@@ -101,9 +90,9 @@ class Slave(MPIClass):
         elif stat.S_ISSOCK(fmode): ftype = 's'; self.st_modes['sock']  += 1
         elif stat.S_ISDIR(fmode):  assert False # huh??
 
-        print("[{:3d}]({}) {}".format(self.rank, ftype, filename))
+        self.log(self.LOG_DEBUG, "[{:3d}]({}) {}", self.rank, ftype, filename)
 
-        if self.tar: self.tar.add(filename, recursive=False)
+        self.tar.writer(member_size(statinfo)).add(filename, statinfo)
 
         return
 
@@ -128,6 +117,13 @@ class Slave(MPIClass):
                 assert next_dir
 
                 tstart = MPI.Wtime()
-                self.process_directory(next_dir)
+                self.process_directory(self.link.decode(next_dir))
+
+            if self.telemetry: self.telemetry.poll()
+            self.poll_log()
+
+        if self.journal: self.journal.close()
+        self.tar.close()
+        if self.telemetry: self.telemetry.finalize()
 
         return
@@ -0,0 +1 @@
+../telemetry.py
\ No newline at end of file
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 
+from mpi4py import MPI
+import bundle
+bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
 from workthief2 import WorkThief as Base
 
 ################################################################################
@@ -15,7 +18,7 @@ class EchoFiles(Base):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def process_directory(self, dirname, statinfo=None):
         Base.process_directory(self,dirname,statinfo)
-        print(dirname)
+        self.log(self.LOG_INFO, dirname)
         return
 
 
@@ -23,7 +26,7 @@ class EchoFiles(Base):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def process_file(self, filename, statinfo=None):
         Base.process_file(self,filename,statinfo)
-        print(filename)
+        self.log(self.LOG_INFO, filename)
         return
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+# keys and values are escaped so that any path, including ones with tabs,
+# newlines or bytes that are not UTF-8, fits on one line
+ESCAPES   = str.maketrans({ '\\' : '\\\\', '\t' : '\\t', '\n' : '\\n' })
+UNESCAPES = { 't' : '\t', 'n' : '\n' }
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def escape(text):
+    return text.translate(ESCAPES)
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def unescape(text):
+    if '\\' not in text: return text
+    out = []
+    chars = iter(text)
+    for c in chars:
+        if c == '\\':
+            c = next(chars, '')
+            c = UNESCAPES.get(c, c)
+        out.append(c)
+    return ''.join(out)
+
+
+
+################################################################################
+class Journal:
+    """ Append-only record of completed work, one escaped 'key<TAB>value'
+    line per item, so a restarted run can skip what is already done.
+
+    Lines are buffered, then flushed and fsync'ed every 'sync_records'
+    records or 'sync_seconds' seconds, whichever is first (record() and
+    poll() check), and on close().  A crash loses at most the records
+    since the last sync.  With 'restart' an existing
+    journal is read into 'entries' (a torn last line from a crash is cut
+    off) and appended to; otherwise it is started afresh.  'before_sync',
+    if given, is called first on each sync, e.g. to make what the records
+    refer to durable before they are.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, path, restart=False, sync_records=64, sync_seconds=5., before_sync=None):
+        self.path         = path
+        self.sync_records = sync_records
+        self.sync_seconds = sync_seconds
+        self.before_sync  = before_sync
+        self.entries      = {}
+        self.unsynced     = 0
+        self.nsyncs       = 0
+        self.last_sync    = time.time()
+
+        if restart and os.path.exists(path):
+            self.entries = self.read(path)
+            self.out = open(path, 'a', encoding='utf-8', errors='surrogateescape')
+        else:
+            self.out = open(path, 'w', encoding='utf-8', errors='surrogateescape')
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    @staticmethod
+    def read(path, truncate=True):
+        # {key : value} from complete lines, truncating any partial last line
+        # (or just ignoring it, for a journal another process may own)
+        entries = {}
+        good = 0
+        with open(path, 'rb') as inp:
+            for line in inp:
+                if not line.endswith(b'\n'): break
+                good += len(line)
+                key, _, value = line[:-1].decode('utf-8', 'surrogateescape').partition('\t')
+                entries[unescape(key)] = unescape(value)
+        if truncate and good != os.path.getsize(path):
+            os.truncate(path, good)
+        return entries
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __contains__(self, key):
+        return key in self.entries
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def record(self, key, value=''):
+        value = str(value)
+        self.entries[key] = value
+        self.out.write("{}\t{}\n".format(escape(key), escape(value)))
+        self.unsynced += 1
+        self.poll()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def poll(self):
+        # sync if enough records, or old enough ones, are waiting
+        if self.unsynced and (self.unsynced >= self.sync_records or
+                              time.time() - self.last_sync >= self.sync_seconds):
+            self.sync()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def sync(self):
+        if self.before_sync: self.before_sync()
+        self.out.flush()
+        os.fsync(self.out.fileno())
+        self.unsynced  = 0
+        self.nsyncs   += 1
+        self.last_sync = time.time()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        if self.out:
+            self.sync()
+            self.out.close()
+            self.out = None
+        return
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import os, sys
+import shlex
+import subprocess
+
+# Protocol between a walker and its long-lived directory lister helper,
+# all records NUL terminated byte strings:
+#
+#   walker -> helper : a batch of directory paths, then an empty record
+#   helper -> walker : for each directory in order, one record per entry,
+#                      a type byte ('d' directory, 'l' symlink, 'f' other)
+#                      followed by the entry name, or one 'E<message>'
+#                      record if it cannot be listed; then an empty record
+#
+# The helper reads a whole batch before writing, so neither side can block
+# the other on a full pipe.  Running this file is the stand-in helper;
+# anything speaking the protocol (e.g. a Lustre tool) can replace it.
+
+
+
+################################################################################
+class ExternalLister:
+    """ Client side: one helper process for the life of the walker. """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, cmd=None):
+        if not cmd: cmd = [ sys.executable, os.path.abspath(__file__) ]
+        elif isinstance(cmd, str): cmd = shlex.split(cmd)
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self.rest = b''
+        self.nbatches = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def scan(self, dirs):
+        """ [(entries, error), ...] for each of 'dirs', entries being
+        (type byte, name bytes) pairs and error None or a message """
+        self.proc.stdin.write(b''.join(os.fsencode(d) + b'\0' for d in dirs) + b'\0')
+        self.nbatches += 1
+
+        results = []
+        entries = []
+        error = None
+        while len(results) < len(dirs):
+            chunk = self.proc.stdout.read(1024*1024)
+            if not chunk: raise RuntimeError("directory lister exited ({})".format(self.proc.poll()))
+            records = (self.rest + chunk).split(b'\0')
+            self.rest = records.pop()
+            for r in records:
+                if not r:
+                    results.append((entries, error))
+                    entries = []
+                    error = None
+                elif r[:1] == b'E':
+                    error = os.fsdecode(r[1:])
+                else:
+                    entries.append((r[:1], r[1:]))
+        return results
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+        return
+
+
+
+################################################################################
+def serve(inp, out):
+    """ stand-in helper: list each batch of directories with scandir """
+    rest = b''
+    batch = []
+    while True:
+        chunk = inp.read1(1024*1024)
+        if not chunk: break
+        records = (rest + chunk).split(b'\0')
+        rest = records.pop()
+        for r in records:
+            if r:
+                batch.append(r)
+                continue
+            for d in batch:
+                try:
+                    with os.scandir(d) as it:
+                        for di in it:
+                            t = b'd' if di.is_dir(follow_symlinks=False) else b'l' if di.is_symlink() else b'f'
+                            out.write(t + di.name + b'\0')
+                except OSError as e:
+                    out.write(b'E' + os.fsencode(str(e)) + b'\0')
+                out.write(b'\0')
+            out.flush()
+            batch = []
+    return
+
+
+
+################################################################################
+if __name__ == "__main__":
+    serve(sys.stdin.buffer, sys.stdout.buffer)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+import argparse
+import random
+import os
+
+
+
+################################################################################
+def parse_range(spec):
+    """ 'N' -> (N,N), 'lo:hi' -> (lo,hi), integers """
+    vals = [int(v) for v in str(spec).split(':')]
+    return (vals[0], vals[-1])
+
+
+
+################################################################################
+def parse_sizes(spec):
+    """ File size distribution, returns a function of a random.Random:
+          'pow:lo:hi'           10**randint(lo,hi) bytes, like write_rand_data
+          'const:N'             N bytes
+          'lognormal:mu:sigma'  int(lognormvariate(mu,sigma)) bytes
+    """
+    kind, *args = spec.split(':')
+    if kind == 'pow':
+        lo, hi = int(args[0]), int(args[1])
+        return lambda rng: 10**rng.randint(lo, hi)
+    if kind == 'const':
+        n = int(args[0])
+        return lambda rng: n
+    if kind == 'lognormal':
+        mu, sigma = float(args[0]), float(args[1])
+        return lambda rng: int(rng.lognormvariate(mu, sigma))
+    raise ValueError("unknown size distribution '{}'".format(spec))
+
+
+
+################################################################################
+class TreeMaker:
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, args):
+        self.args     = args
+        self.fanout   = parse_range(args.fanout)
+        self.files    = parse_range(args.files)
+        self.sizes    = parse_sizes(args.sizes)
+        self.max_size = args.max_size
+        self.buf      = memoryview(random.Random(args.seed).randbytes(min(self.max_size, 1024*1024)))
+        self.num_dirs = 0
+        self.num_files = 0
+        self.num_links = 0
+        self.num_bytes = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def write_file(self, pathname, size):
+        # recycle one random buffer, so content generation is not the bottleneck
+        size = min(size, self.max_size)
+        with open(pathname, 'wb') as f:
+            remaining = size
+            while remaining:
+                n = min(remaining, len(self.buf))
+                f.write(self.buf[:n])
+                remaining -= n
+        self.num_files += 1
+        self.num_bytes += size
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def populate(self, dirname, rng, nfiles):
+        os.makedirs(dirname, exist_ok=True)
+        self.num_dirs += 1
+        last = None
+        for i in range(nfiles):
+            pathname = os.path.join(dirname, "f{:05d}.dat".format(i))
+            if last and rng.random() < self.args.symlinks:
+                os.symlink(os.path.basename(last), pathname)
+                self.num_links += 1
+            else:
+                self.write_file(pathname, self.sizes(rng))
+                last = pathname
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def subtree(self, dirname, rng, depth):
+        self.populate(dirname, rng, rng.randint(*self.files))
+        if depth <= 0: return
+        for d in range(rng.randint(*self.fanout)):
+            self.subtree(os.path.join(dirname, "d{:04d}".format(d)), rng, depth-1)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run(self, comm):
+        args   = self.args
+        rank   = comm.Get_rank()
+        nranks = comm.Get_size()
+
+        # top-level subtrees are dealt round-robin to ranks.  each is seeded
+        # by its index, so the tree does not depend on the number of ranks
+        rng = random.Random(args.seed)
+        ntop = rng.randint(*self.fanout)
+        if rank == 0:
+            self.populate(args.top, rng, rng.randint(*self.files))
+        comm.Barrier()
+
+        for t in range(rank, ntop, nranks):
+            depth = args.depth - 1 + (args.skew if t == 0 else 0)
+            self.subtree(os.path.join(args.top, "d{:04d}".format(t)),
+                         random.Random(args.seed*1000003 + t), depth)
+
+        # one huge flat directory, split by file index across ranks
+        if args.flat:
+            flatdir = os.path.join(args.top, "flat")
+            if rank == 0: os.makedirs(flatdir, exist_ok=True)
+            comm.Barrier()
+            lo = (args.flat * rank) // nranks
+            hi = (args.flat * (rank+1)) // nranks
+            for i in range(lo, hi):
+                rng = random.Random(args.seed*1000003 + ntop + i)
+                self.write_file(os.path.join(flatdir, "f{:08d}.dat".format(i)), self.sizes(rng))
+            if rank == 0: self.num_dirs += 1
+
+        totals = [comm.reduce(v, op=MPI.SUM, root=0) for v in (self.num_dirs, self.num_files,
+                                                               self.num_links, self.num_bytes)]
+        if rank == 0:
+            print("{}: {} dirs, {} files, {} symlinks, {:.5e} bytes".format(args.top, *totals))
+        return
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic directory tree, in parallel when run under MPI.")
+    parser.add_argument("top", help="top directory to create")
+    parser.add_argument("--depth",    type=int, default=3, help="levels of subdirectories (default: %(default)s)")
+    parser.add_argument("--fanout",   default="4:16", help="subdirectories per directory, N or lo:hi (default: %(default)s)")
+    parser.add_argument("--files",    default="0:20", help="files per directory, N or lo:hi (default: %(default)s)")
+    parser.add_argument("--sizes",    default="pow:1:5", help="file size distribution: pow:lo:hi, const:N or lognormal:mu:sigma (default: %(default)s)")
+    parser.add_argument("--max-size", type=int, default=1024**3, help="cap on any one file size (default: %(default)s)")
+    parser.add_argument("--flat",     type=int, default=0, help="also create flat/ with this many files (default: %(default)s)")
+    parser.add_argument("--skew",     type=int, default=0, help="extra levels under the first top-level subtree (default: %(default)s)")
+    parser.add_argument("--symlinks", type=float, default=0., help="fraction of files created as symlinks to a sibling (default: %(default)s)")
+    parser.add_argument("--seed",     type=int, default=1, help="random seed (default: %(default)s)")
+
+    TreeMaker(parser.parse_args()).run(MPI.COMM_WORLD)
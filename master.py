@@ -2,7 +2,10 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
+from collections import deque
 import os
+import sys
+import time
 
 
 
@@ -28,41 +31,280 @@ class Master(MPIClass):
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def run(self):
+    def serve(self):
+        # service mode: instead of a fixed number of steps, take batches of
+        # tasks from a drop directory and/or UNIX socket (see TaskService)
+        # until told to shut down, keeping the slaves and MPI job alive
+        # between batches
+        from service import TaskService
+        service = TaskService(dropdir     = self.get_option('serve_dir'),
+                              socket_path = self.get_option('serve_socket'))
+        poll = self.get_option('serve_poll', 0.001)
+        print("  --> Serving task batches from {}".format(
+            " and ".join(p for p in (service.dropdir, service.socket_path) if p)))
+
         status = MPI.Status()
-        instruct = None
-        result = None
+        nslaves = self.comm.Get_size() - 1
+        idle = deque()
+        busy = {}
+        while True:
+            # collect ready slaves, and the result of what they ran last
+            while self.comm.iprobe(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status):
+                rank = status.Get_source()
+                for task, result in self.comm.recv(source=rank, tag=self.tags['ready']):
+                    if task is not None and rank in busy:
+                        batch = service.complete(busy.pop(rank), result)
+                        if batch:
+                            self.log(self.LOG_INFO, "batch {}: {} tasks done in {:.4f} sec.",
+                                     batch.name, len(batch.tasks), time.time() - batch.tstart)
+                    elif result:
+                        print(result)
+                idle.append(rank)
+
+            self.poll_log()
+            if len(idle) == nslaves and service.stopped(): break
+
+            # hand out tasks to idle slaves, or wait a little for either
+            item = service.get(timeout=poll) if idle else None
+            if item:
+                batch, task = item
+                rank = idle.popleft()
+                busy[rank] = batch
+                self.comm.send(task, dest=rank, tag=self.tags['execute'])
+                self.log(self.LOG_DEBUG, "Running {} (batch {}) on rank {}", task, batch.name, rank)
+            elif not idle:
+                time.sleep(poll)
+
+        print("  --> Finished serving {} batches, Terminating ranks".format(service.nbatches))
+        service.close()
+        requests = [ self.comm.isend(None, dest=rank, tag=self.tags['terminate']) for rank in idle ]
+        MPI.Request.waitall(requests)
+        return
+
 
-        # execution loop, until we determine we are finished.
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_journal(self):
+        # completed tasks and their results go to the 'journal' file; with
+        # 'restart' those already in it are skipped
+        self.journal = None
+        self.done    = set()
+        path = self.get_option('journal', '')
+        if not path:
+            if self.get_option('restart', False):
+                self.log(self.LOG_ERROR, "restart requested without a journal, running all tasks")
+            return
+        from journal import Journal
+        self.journal = Journal(path,
+                               restart      = self.get_option('restart', False),
+                               sync_records = self.get_option('journal_sync_records', 64),
+                               sync_seconds = self.get_option('journal_sync_seconds', 5.))
+        self.done = set(self.journal.entries)
+        if self.done:
+            print("  --> Restarting, skipping {} tasks journaled in {}".format(len(self.done), path))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def next_task(self):
+        # a timed out task to run again, else the next step not yet done;
+        # None when there is nothing left to hand out
+        while self.retry:
+            task = self.retry.popleft()
+            if task not in self.done: return task
         while not self.finished():
-            # get 'result' from any slave rank that is 'ready'.
-            result = self.comm.recv(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status)
-            ready_rank = status.Get_source()
+            task = "step_{:05d}".format(self.iteration)
+            if task not in self.done: return task
+        return None
 
-            # do something useful with the result.
-            if result: print(result)
 
-            # send instructions to the ready rank. For this simple example
-            # this is just a string, but could be any pickleable data type
-            instruct = "step_{:05d}".format(self.iteration)
-            self.comm.send(instruct, dest=ready_rank, tag=self.tags['execute'])
-            print("Running step {} on rank {}".format(self.iteration,ready_rank))
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def wait_ready(self, status):
+        # the next 'ready' slave rank, after recording the results it
+        # reports.  Polls while there is a journal to sync or tasks to time
+        # out, returning None when a task has just timed out.
+        if self.journal or self.timeout:
+            while not self.comm.iprobe(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status):
+                if self.journal: self.journal.poll()
+                self.poll_log()
+                if self.check_timeouts(): return None
+                time.sleep(0.001)
+
+        results = self.comm.recv(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status)
+        rank = status.Get_source()
+
+        task = self.running.pop(rank, None)
+        if task: self.ran.add(task[0])
+        for task, result in results:
+            self.complete(task, result, rank)
+        return rank
 
 
-        # cleanup loop, send 'terminate' tag to each slave rank in
-        # whatever order they become ready.
-        # Don't forget to catch their final 'result'
-        print("  --> Finished dispatch, Terminating ranks")
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def complete(self, task, result, rank):
+        # do something useful with the result.  task None is just a note
+        if result: print(result)
+        if task is None: return
+        if task in self.done:
+            self.log(self.LOG_INFO, "{} also completed on rank {}, after being reassigned", task, rank)
+        else:
+            self.done.add(task)
+            if self.journal: self.journal.record(task, result)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def check_timeouts(self):
+        # queue tasks running longer than 'task_timeout' to run again on
+        # another rank.  whichever copy completes first counts
+        if not self.timeout: return False
+        now = time.time()
+        expired = False
+        for rank, (task, tstart) in self.running.items():
+            if task not in self.retried and now - tstart > self.timeout:
+                self.log(self.LOG_ERROR, "{} timed out on rank {} after {:.1f} sec., reassigning",
+                         task, rank, now - tstart)
+                self.retried.add(task)
+                self.retry.append(task)
+                expired = True
+        return expired
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run_batches(self):
+        # node queue and pool modes (Slave.run_node, Slave.run_pool): hand a
+        # batch of tasks to whichever slave asks to refill its queue, and
+        # take batches of results, until every slave has sent its last
+        if not self.get_option('pool', 0):
+            self.comm.Split(MPI.UNDEFINED, 0)
+        if self.timeout:
+            self.log(self.LOG_ERROR, "task_timeout is not supported with node_queue or pool, ignored")
+
+        status = MPI.Status()
+        nslaves = self.comm.Get_size() - 1
+        nfinal = 0
+        nbatches = 0
+        while nfinal < nslaves:
+            msg = self.comm.recv(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status)
+            rank = status.Get_source()
+            if status.Get_tag() == self.tags['refill']:
+                tasks = []
+                while len(tasks) < msg:
+                    task = self.next_task()
+                    if task is None: break
+                    tasks.append(task)
+                self.comm.send(tasks, dest=rank, tag=self.tags['refill'])
+                if tasks:
+                    nbatches += 1
+                    print("Running {} .. {} from rank {}".format(tasks[0], tasks[-1], rank))
+            else:
+                results, final = msg
+                for task, result in results:
+                    self.complete(task, result, rank)
+                nfinal += final
+            self.poll_log()
+
+        print("  --> Finished dispatch in {} batches".format(nbatches))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run(self):
+        if self.get_option('serve_dir') or self.get_option('serve_socket'):
+            return self.serve()
+
+        self.init_journal()
+        self.timeout = self.get_option('task_timeout', 0.)
+        self.running = {}       # rank : (task, start time)
+        self.retry   = deque()  # timed out tasks, to run again
+        self.retried = set()
+        self.ran     = set()    # tasks that finished on some rank
+
+        if self.get_option('node_queue', False) or self.get_option('pool', 0):
+            self.run_batches()
+            self.close_journal()
+            return
+
+        status = MPI.Status()
+        nslaves = self.comm.Get_size() - 1
+        idle = deque()
         requests = []
-        for s in range(1,self.comm.Get_size()):
-            result = self.comm.recv(source=MPI.ANY_SOURCE, tag=self.tags['ready'], status=status)
-            if result: print(result)
-            # send terminate tag, but no need to wait
-            requests.append(
-                self.comm.isend(None, dest=status.Get_source(), tag=self.tags['terminate']))
+        dispatching = True
+
+        # execution loop, until every slave has been told to terminate.
+        while len(requests) < nslaves:
+            # get 'result' from any slave rank that is 'ready'.
+            ready_rank = self.wait_ready(status)
+            if ready_rank is not None: idle.append(ready_rank)
+            self.poll_log()
+
+            # send instructions to the ready ranks. For this simple example
+            # this is just a string, but could be any pickleable data type
+            while idle:
+                instruct = self.next_task()
+                if instruct is None: break
+                ready_rank = idle.popleft()
+                self.comm.send(instruct, dest=ready_rank, tag=self.tags['execute'])
+                self.running[ready_rank] = (instruct, time.time())
+                print("Running {} on rank {}".format(instruct, ready_rank))
+
+            # cleanup, once all is handed out send 'terminate' tag to each
+            # slave rank in whatever order they become ready, but no need to
+            # wait.  With timeouts idle ranks are kept while tasks are still
+            # running, in case one needs to be run again.
+            if idle and not (self.timeout and self.unfinished()):
+                if dispatching:
+                    print("  --> Finished dispatch, Terminating ranks")
+                    dispatching = False
+                while idle:
+                    requests.append(
+                        self.comm.isend(None, dest=idle.popleft(), tag=self.tags['terminate']))
+
+            # the ranks left are stuck on tasks that finished elsewhere
+            if not dispatching and self.running and not self.unfinished(): break
 
         # OK, messages sent, wait for all to complete
         MPI.Request.waitall(requests)
 
+        # with a journal, slaves hold tasks until their output is durable,
+        # and report the last of them once their archives are closed (with
+        # timeouts, they all report then)
+        if self.journal or self.timeout:
+            for n in range(len(requests)):
+                results, final = self.comm.recv(source=MPI.ANY_SOURCE, tag=self.tags['results'], status=status)
+                for task, result in results:
+                    self.complete(task, result, status.Get_source())
+
+        self.close_journal()
+
+        # every task is done, but a stuck rank would hold up MPI_Finalize
+        if self.running:
+            self.log(self.LOG_ERROR, "ranks {} still stuck on tasks completed elsewhere, aborting",
+                     " ".join(str(r) for r in sorted(self.running)))
+            self.cleanup()
+            sys.stdout.flush()
+            self.comm.Abort(1)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def unfinished(self):
+        # whether a running task has not yet finished on any rank
+        return any(task not in self.ran for task, tstart in self.running.values())
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.log(self.LOG_INFO, "journaled {} tasks to {} in {} syncs",
+                     len(self.journal.entries), self.journal.path, self.journal.nsyncs)
         return
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+import argparse
+import tarfile
+import os, sys
+
+BLOCKSIZE  = tarfile.BLOCKSIZE
+RECORDSIZE = tarfile.RECORDSIZE
+
+
+
+################################################################################
+def read_index(archive):
+    """ [(offset, size, name)] from the '<archive>.idx' sidecar, or None """
+    try:
+        with open(archive + ".idx") as f:
+            return [ (int(o), int(s), n) for o,s,n in (line.rstrip('\n').split('\t', 2) for line in f) ]
+    except OSError:
+        return None
+
+
+
+################################################################################
+def payload(archive):
+    """ (length, members) of an uncompressed archive: the offset just past
+    its last member, i.e. without the end-of-archive blocks and record
+    padding, and its [(offset, size, name)] members.  With a .idx sidecar
+    only the last member's header is read, otherwise every header is """
+    index = read_index(archive)
+    with open(archive, 'rb') as f:
+        if index: f.seek(index[-1][0])
+        with tarfile.open(fileobj=f, mode='r:') as tf:
+            members = [ (ti.offset, ti.size, ti.name) for ti in tf ]
+            end = tf.offset
+    return end, index or members
+
+
+
+################################################################################
+class MergeTar:
+    """ Parallel 'tar --concatenate' of uncompressed archives.
+
+    Every input's payload length is measured (in parallel, cheaply when it
+    has a .idx sidecar), which fixes its offset in the output.  Rank 0
+    creates the output at its final size, so the end-of-archive marker is
+    already there as zeros, then all ranks copy slices of the inputs to
+    their offsets with os.copy_file_range, or pread/pwrite where that is
+    not supported.  A merged '<output>.idx' is written last.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, args, comm):
+        self.args    = args
+        self.comm    = comm
+        self.rank    = comm.Get_rank()
+        self.nranks  = comm.Get_size()
+        self.nbytes  = 0
+        self.use_cfr = hasattr(os, 'copy_file_range')
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def copy(self, src, dst, offset_src, offset_dst, count):
+        while count:
+            n = 0
+            if self.use_cfr:
+                try:
+                    n = os.copy_file_range(src, dst, count, offset_src, offset_dst)
+                except OSError:
+                    self.use_cfr = False
+                    continue
+            else:
+                data = os.pread(src, min(count, 4*1024*1024), offset_src)
+                if data: n = os.pwrite(dst, data, offset_dst)
+            if n == 0: raise IOError("unexpected end of input")
+            offset_src += n
+            offset_dst += n
+            count      -= n
+            self.nbytes += n
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run(self):
+        args   = self.args
+        tstart = MPI.Wtime()
+
+        # payload lengths, strided over ranks
+        mine = { i : payload(args.inputs[i]) for i in range(self.rank, len(args.inputs), self.nranks) }
+        sizes = {}
+        for d in self.comm.allgather({ i : v[0] for i,v in mine.items() }): sizes.update(d)
+        offsets = [0]
+        for i in range(len(args.inputs)): offsets.append(offsets[-1] + sizes[i])
+        total = offsets[-1] + 2*BLOCKSIZE
+        total += -total % RECORDSIZE
+
+        if self.rank == 0:
+            with open(args.output, 'wb') as f: f.truncate(total)
+        self.comm.Barrier()
+
+        # copy in slices of at most --chunk bytes, dealt round-robin
+        slices = [ (i, lo, min(args.chunk, sizes[i]-lo))
+                   for i in range(len(args.inputs)) for lo in range(0, sizes[i], args.chunk) ]
+        dst = os.open(args.output, os.O_WRONLY)
+        for i, lo, count in slices[self.rank::self.nranks]:
+            src = os.open(args.inputs[i], os.O_RDONLY)
+            try:
+                self.copy(src, dst, lo, offsets[i]+lo, count)
+            finally:
+                os.close(src)
+        os.close(dst)
+
+        # merged index, in input order
+        members = self.comm.gather({ i : v[1] for i,v in mine.items() })
+        nbytes  = self.comm.reduce(self.nbytes, op=MPI.SUM, root=0)
+        if self.rank == 0:
+            allmembers = {}
+            for d in members: allmembers.update(d)
+            with open(args.output + ".idx", 'w') as f:
+                for i in range(len(args.inputs)):
+                    for offset, size, name in allmembers[i]:
+                        f.write("{}\t{}\t{}\n".format(offsets[i] + offset, size, name))
+            elapsed = MPI.Wtime() - tstart
+            print("merged {} archives, {} members, {:.5e} bytes into {} in {:.3f} s ({:.5e} bytes/s)".format(
+                len(args.inputs), sum(len(m) for m in allmembers.values()), nbytes, args.output,
+                elapsed, nbytes/elapsed if elapsed else 0.))
+
+        self.comm.Barrier()
+        if args.remove:
+            for i in range(self.rank, len(args.inputs), self.nranks):
+                for f in (args.inputs[i], args.inputs[i] + ".idx"):
+                    if os.path.exists(f): os.unlink(f)
+        return 0
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concatenate uncompressed tar archives into one, in parallel under MPI.")
+    parser.add_argument("inputs", nargs='+', help="archives to merge, in order")
+    parser.add_argument("-o", "--output", required=True, help="merged archive, also gets a .idx sidecar")
+    parser.add_argument("--chunk",  type=int, default=256*1024*1024, help="bytes per copy slice (default: %(default)s)")
+    parser.add_argument("--remove", action='store_true', help="remove the inputs (and their .idx) once merged")
+    args = parser.parse_args()
+
+    for f in args.inputs:
+        if not f.endswith('.tar'):
+            parser.error("{}: only uncompressed .tar archives can be merged".format(f))
+        if os.path.abspath(f) == os.path.abspath(args.output):
+            parser.error("{}: output is also an input".format(f))
+
+    sys.exit(MergeTar(args, MPI.COMM_WORLD).run())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+from array import array
+import pickle
+
+# header, int64 words at these byte offsets
+LOCK    = 0     # 0 free, else owner node rank+1
+HEAD    = 8     # next slot to take
+TAIL    = 16    # one past the last filled slot
+REFILL  = 24    # 0, or node rank+1 of the rank refilling the queue
+DONE    = 32    # 1 once the scheduler has no more tasks
+HEADER  = 40
+
+# results of take() besides a task
+EMPTY    = object()
+FINISHED = object()
+
+
+
+################################################################################
+class NodeQueue:
+    """ Task queue in memory shared by the ranks of one node.
+
+    A ring of 'nslots' slots of 'slot_bytes' bytes each (a 4 byte length
+    and a pickled task), with head, tail and flags in a header, in a window
+    from MPI.Win.Allocate_shared on 'comm' (one node's ranks).  Ranks take
+    tasks under a spin lock (Compare_and_swap), reading and writing the
+    memory directly in between, so a task costs no messages at all.
+
+    One rank at a time refills the queue from the global scheduler: the
+    first to see it running low claims REFILL, asks for a batch and push()es
+    it.  finish() marks the scheduler dry, after which an empty queue makes
+    take() return FINISHED.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, comm, nslots=1024, slot_bytes=256):
+        self.comm       = comm
+        self.rank       = comm.Get_rank()
+        self.nslots     = nslots
+        self.slot_bytes = slot_bytes
+        size = HEADER + nslots*slot_bytes if self.rank == 0 else 0
+        self.win = MPI.Win.Allocate_shared(size, disp_unit=1, comm=comm)
+        buf, _ = self.win.Shared_query(0)
+        self.mem    = memoryview(buf).cast('B')
+        self.header = self.mem[:HEADER].cast('q')
+        if self.rank == 0:
+            self.header[:] = array('q', [0, 0, 0, 0, 0])
+        comm.Barrier()
+        self.win.Lock_all()
+        self.me     = array('q', [self.rank+1])
+        self.zero   = array('q', [0])
+        self.result = array('q', [0])
+        self.lock_fails = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def free(self):
+        self.header.release()
+        self.mem.release()
+        self.win.Unlock_all()
+        self.win.Free()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def swap(self, disp, compare, value):
+        # atomic compare & swap of a header word, true if it was 'compare'
+        self.win.Compare_and_swap([value, MPI.INT64_T], [compare, MPI.INT64_T],
+                                  [self.result, MPI.INT64_T], 0, disp)
+        self.win.Flush(0)
+        return self.result[0] == compare[0]
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def lock(self):
+        while not self.swap(LOCK, self.zero, self.me):
+            self.lock_fails += 1
+        # see the other ranks' stores
+        self.win.Sync()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def unlock(self):
+        self.win.Sync()
+        self.swap(LOCK, self.me, self.zero)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def take(self):
+        """ (task, number left), or (EMPTY or FINISHED, 0) """
+        self.lock()
+        head, tail = self.header[HEAD//8], self.header[TAIL//8]
+        if head == tail:
+            done = self.header[DONE//8]
+            self.unlock()
+            return (FINISHED if done else EMPTY, 0)
+        start = HEADER + (head % self.nslots)*self.slot_bytes
+        n = int.from_bytes(self.mem[start:start+4], 'little')
+        data = bytes(self.mem[start+4:start+4+n])
+        self.header[HEAD//8] = head + 1
+        self.unlock()
+        return (pickle.loads(data), tail - head - 1)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def room(self):
+        # free slots, as of now
+        self.lock()
+        n = self.nslots - (self.header[TAIL//8] - self.header[HEAD//8])
+        self.unlock()
+        return n
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def push(self, tasks):
+        # (refiller) append 'tasks', which must fit in room()
+        items = [ pickle.dumps(t) for t in tasks ]
+        for data in items:
+            if len(data) + 4 > self.slot_bytes:
+                raise ValueError("task of {} bytes does not fit a {} byte slot".format(len(data), self.slot_bytes))
+        self.lock()
+        tail = self.header[TAIL//8]
+        assert tail + len(items) - self.header[HEAD//8] <= self.nslots
+        for data in items:
+            start = HEADER + (tail % self.nslots)*self.slot_bytes
+            self.mem[start:start+4] = len(data).to_bytes(4, 'little')
+            self.mem[start+4:start+4+len(data)] = data
+            tail += 1
+        self.header[TAIL//8] = tail
+        self.unlock()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def claim_refill(self):
+        # true if we are now the one rank refilling the queue
+        return self.swap(REFILL, self.zero, self.me)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def release_refill(self):
+        self.swap(REFILL, self.me, self.zero)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def finish(self):
+        self.lock()
+        self.header[DONE//8] = 1
+        self.unlock()
+        return
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import os
+
+# Front coding of path lists for messages: each path is stored as the
+# length of the prefix it shares with the previous one, the length of the
+# rest, and the rest.  Directories queued together are mostly siblings, so
+# a list costs little more than its leaf names.  Lengths are LEB128
+# varints, one byte below 128.
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def get_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80: return n, pos
+        shift += 7
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def shared(a, b):
+    # length of the common prefix of byte strings a & b, by bisection on
+    # slice comparisons (each one a memcmp) rather than byte by byte
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]: return n
+    lo, hi = 0, n       # a[:lo] == b[:lo], a[:hi] != b[:hi]
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[:mid] == b[:mid]: lo = mid
+        else: hi = mid
+    return lo
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def pack(paths, prev=b''):
+    """ bytes encoding of the list 'paths', front coded starting from
+    'prev' (which the receiver must pass to unpack()) """
+    out = bytearray()
+    for p in paths:
+        b = os.fsencode(p)
+        n = shared(prev, b)
+        put_varint(out, n)
+        put_varint(out, len(b) - n)
+        out += b[n:]
+        prev = b
+    return bytes(out)
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def unpack(data, prev=b''):
+    """ the list of paths in pack()ed 'data' """
+    paths = []
+    pos = 0
+    while pos < len(data):
+        n, pos = get_varint(data, pos)
+        m, pos = get_varint(data, pos)
+        prev = prev[:n] + data[pos:pos+m]
+        pos += m
+        paths.append(os.fsdecode(prev))
+    return paths
+
+
+
+################################################################################
+class PathLink:
+    """ Front coding across the messages of one sender/receiver pair: each
+    path is encoded against the previous one sent on the link, so single
+    path messages shrink too.  Both ends keep a PathLink and must see the
+    same messages in the same order. """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self):
+        self.prev = b''
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def encode(self, path):
+        b = os.fsencode(path)
+        data = pack((b,), self.prev)
+        self.prev = b
+        return data
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def decode(self, data):
+        path = unpack(data, self.prev)[0]
+        self.prev = os.fsencode(path)
+        return path
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+from array import array
+from collections import deque
+import os
+import shutil
+import tempfile
+
+SEGMENT_BYTES = 1024*1024
+
+
+
+################################################################################
+class Segment:
+    """ Paths start..len(ends) of one arena: encoded names back to back in
+    'data', each ending at the matching entry of 'ends'.  A spilled
+    segment has data & ends on disk, in 'path'. """
+
+    __slots__ = ('data', 'ends', 'start', 'path')
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self):
+        self.data  = bytearray()
+        self.ends  = array('q')
+        self.start = 0
+        self.path  = None
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __len__(self):
+        return len(self.ends) - self.start
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def nbytes(self):
+        return 0 if self.path else len(self.data) + 8*len(self.ends)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def item(self, i):
+        return os.fsdecode(bytes(self.data[self.ends[i-1] if i else 0 : self.ends[i]]))
+
+
+
+################################################################################
+class PathQueue:
+    """ Pending directories, as a list-like store that costs a few bytes
+    over the encoded path per entry instead of a str object each.
+
+    Paths live in a deque of Segments of about SEGMENT_BYTES.  Work is
+    popped from the back (depth first) and split off from the front (for
+    other ranks), as with a list.  When 'max_bytes' is set and the arenas
+    in memory exceed it, the oldest segments, those nearest the front and
+    so the last to be needed locally, are written to files in 'spill_dir'
+    and read back when the front reaches them.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, paths=(), max_bytes=0, spill_dir=None):
+        self.segments  = deque([Segment()])
+        self.count     = 0
+        self.mem_bytes = 0
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.tmpdir    = None
+        self.nspilled  = 0
+        self.extend(paths)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __len__(self):
+        return self.count
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __iter__(self):
+        # front to back, without loading spilled segments for good
+        for seg in self.segments:
+            if seg.path: seg = self.read(seg.path)
+            for i in range(seg.start, len(seg.ends)): yield seg.item(i)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __repr__(self):
+        return repr(list(self))
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def append(self, path):
+        seg = self.segments[-1]
+        n = len(seg.data)
+        seg.data += os.fsencode(path)
+        seg.ends.append(len(seg.data))
+        self.count += 1
+        self.mem_bytes += len(seg.data) - n + 8
+        if len(seg.data) >= SEGMENT_BYTES:
+            self.segments.append(Segment())
+            if self.max_bytes and self.mem_bytes > self.max_bytes: self.spill()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def extend(self, paths):
+        for p in paths: self.append(p)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def pop(self):
+        # the most recently appended path
+        if not self.count: raise IndexError("pop from empty PathQueue")
+        seg = self.segments[-1]
+        while not len(seg):
+            self.mem_bytes -= seg.nbytes()
+            self.segments.pop()
+            seg = self.segments[-1]
+            if seg.path: self.load(seg)
+        path = seg.item(len(seg.ends)-1)
+        n = len(seg.data)
+        seg.ends.pop()
+        del seg.data[seg.ends[-1] if seg.ends else 0:]
+        self.count -= 1
+        self.mem_bytes -= n - len(seg.data) + 8
+        return path
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def popleft(self, n):
+        # list of the (up to) 'n' oldest paths, oldest first
+        out = []
+        while len(out) < n and len(out) < self.count:
+            seg = self.segments[0]
+            if seg.path: self.load(seg)
+            while len(out) < n and len(seg):
+                out.append(seg.item(seg.start))
+                seg.start += 1
+            if not len(seg):
+                self.mem_bytes -= seg.nbytes()
+                self.segments.popleft()
+                if not self.segments: self.segments.append(Segment())
+        self.count -= len(out)
+        return out
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def appendleft(self, paths):
+        # put 'paths' back at the front, in order
+        if not paths: return
+        seg = Segment()
+        for p in paths:
+            seg.data += os.fsencode(p)
+            seg.ends.append(len(seg.data))
+        self.segments.appendleft(seg)
+        self.count += len(paths)
+        self.mem_bytes += seg.nbytes()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def spill(self):
+        # write out the oldest in-memory segments until under max_bytes,
+        # never the one being appended to
+        if self.tmpdir is None:
+            self.tmpdir = tempfile.mkdtemp(prefix="pathqueue_", dir=self.spill_dir)
+        for seg in self.segments:
+            if self.mem_bytes <= self.max_bytes or seg is self.segments[-1]: break
+            if seg.path or not len(seg): continue
+            self.mem_bytes -= seg.nbytes()
+            seg.path = os.path.join(self.tmpdir, "{:08d}".format(self.nspilled))
+            self.nspilled += 1
+            with open(seg.path, 'wb') as out:
+                ends = seg.ends[seg.start:]
+                base = seg.ends[seg.start-1] if seg.start else 0
+                out.write(array('q', [len(ends)]).tobytes())
+                out.write(array('q', [e - base for e in ends]).tobytes())
+                out.write(seg.data[base:])
+            seg.data, seg.ends, seg.start = None, None, 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    @staticmethod
+    def read(path):
+        seg = Segment()
+        with open(path, 'rb') as inp:
+            n = array('q')
+            n.frombytes(inp.read(8))
+            seg.ends.frombytes(inp.read(8*n[0]))
+            seg.data = bytearray(inp.read())
+        return seg
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def load(self, seg):
+        # read a spilled segment back in
+        tmp = self.read(seg.path)
+        os.unlink(seg.path)
+        seg.data, seg.ends, seg.start, seg.path = tmp.data, tmp.ends, 0, None
+        self.mem_bytes += seg.nbytes()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        if self.tmpdir: shutil.rmtree(self.tmpdir, ignore_errors=True)
+        self.tmpdir = None
+        return
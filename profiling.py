@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+import numpy as np
+import sys
+
+
+
+################################################################################
+class PhaseProfile:
+    """ Opt-in, per-rank instrumentation of a work loop.
+
+    Cumulative time and call counts per phase, accumulated with lap(),
+    and a log2 histogram of steal latencies in microseconds.  Optionally
+    wraps the run in cProfile or yappi, writing profile-<rank>.prof.
+    report() is collective and prints the reduced results from rank 0.
+    """
+
+    phases = ('scan', 'probe', 'steal', 'reply', 'barrier', 'idle')
+    SCAN, PROBE, STEAL, REPLY, BARRIER, IDLE = range(len(phases))
+
+    # histogram bin b holds latencies in [2**(b-1), 2**b) microseconds
+    nbins = 32
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, rank, mode='timers'):
+        self.rank   = rank
+        self.mode   = mode
+        self.times  = [0.] * len(self.phases)
+        self.counts = [0]  * len(self.phases)
+        self.hist   = [0]  * self.nbins
+        self.profiler = None
+
+        if self.mode == 'yappi':
+            try:
+                import yappi
+                self.profiler = yappi
+            except ImportError:
+                self.mode = 'cprofile'
+
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def start(self):
+        if self.mode == 'yappi':
+            self.profiler.set_clock_type('wall')
+            self.profiler.start()
+        elif self.mode == 'cprofile':
+            self.profiler.enable()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def stop(self):
+        outfile = "profile-{:05d}.prof".format(self.rank)
+        if self.mode == 'yappi':
+            self.profiler.stop()
+            self.profiler.get_func_stats().save(outfile, type='pstat')
+        elif self.mode == 'cprofile':
+            self.profiler.disable()
+            self.profiler.dump_stats(outfile)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def lap(self, phase, t):
+        # charge the time since 't' to 'phase', return the new lap start
+        now = MPI.Wtime()
+        self.times[phase]  += now - t
+        self.counts[phase] += 1
+        return now
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def add(self, phase, dt):
+        self.times[phase]  += dt
+        self.counts[phase] += 1
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def steal_latency(self, dt):
+        b = int(dt*1.e6).bit_length()
+        self.hist[min(b, self.nbins-1)] += 1
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def report(self, comm, settings=None):
+        # collective.  'settings' is an optional dict of tuning parameters
+        # to echo alongside the timings
+        times  = np.array(self.times)
+        counts = np.array(self.counts, dtype=np.int64)
+        hist   = np.array(self.hist,   dtype=np.int64)
+
+        tsum = np.zeros_like(times);  comm.Reduce(times, tsum, op=MPI.SUM, root=0)
+        tmax = np.zeros_like(times);  comm.Reduce(times, tmax, op=MPI.MAX, root=0)
+        tmin = np.zeros_like(times);  comm.Reduce(times, tmin, op=MPI.MIN, root=0)
+        csum = np.zeros_like(counts); comm.Reduce(counts, csum, op=MPI.SUM, root=0)
+        hists = comm.gather(hist, root=0)
+
+        if comm.Get_rank(): return
+
+        nranks = comm.Get_size()
+        sep = "-"*80
+        print(sep)
+        print("Phase profile ({} ranks):".format(nranks))
+        if settings:
+            print("   " + ", ".join("{} = {}".format(k,v) for k,v in settings.items()))
+        print("   {:8s} {:>12s} {:>12s} {:>12s} {:>12s} {:>12s}".format("phase", "total (s)", "mean (s)",
+                                                                     "min (s)", "max (s)", "calls"))
+        for p,name in enumerate(self.phases):
+            print("   {:8s} {:12.5e} {:12.5e} {:12.5e} {:12.5e} {:12d}".format(name, tsum[p], tsum[p]/nranks,
+                                                                             tmin[p], tmax[p], csum[p]))
+
+        total = np.sum(hists, axis=0)
+        if total.any():
+            print("Steal latency, all ranks (usec : count):")
+            for b in np.nonzero(total)[0]:
+                print("   {:>10s} : {}".format("<{}".format(2**b), total[b]))
+
+            # per-rank histograms, one line per rank, to a file
+            with open("steal_latency.txt", "w") as out:
+                out.write("# rank, counts in bins [2**(b-1), 2**b) usec, b = 0..{}\n".format(self.nbins-1))
+                for r,h in enumerate(hists):
+                    out.write("{} {}\n".format(r, " ".join(str(v) for v in h)))
+            print("   (per-rank histograms written to steal_latency.txt)")
+        print(sep)
+        sys.stdout.flush()
+        return
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+from journal import Journal
+from tarwriter import TarWriter, open_tar
+
+# Resuming the tree archivers (tar.py, walktree, dispatch) after a failure.
+#
+# Each archive stream (a rank's archive, a walktree writer's, or a dispatch
+# rank's sequence of parts) keeps a journal '<stream>.journal' next to it,
+# with a 'directory<TAB>offset part' line for every directory whose members
+# are all in the stream, 'offset' being where archive 'part' ended after
+# them.  The archive is fsync'ed before the journal is, so a journaled
+# directory is on disk.
+#
+# On restart, every directory in any of the journals is skipped: still
+# scanned for subdirectories where the walker finds those itself, but its
+# members are not archived again.  Each stream carries on from the end of
+# its last journaled directory, cutting off the members written after it.
+# A directory interrupted part way is archived again in full, so some of
+# its files may appear twice.  Streams no rank carries on, when a restart
+# has fewer ranks or writers, are cut back the same way by rank 0 and
+# closed.  Uncompressed archives only.
+SUFFIX = ".journal"
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def enabled(get_option):
+    return get_option('dir_journal', False) or get_option('restart', False)
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def completed_dirs(outdir='.', prefix='output-', streams=None, targets=None):
+    # every directory journaled in 'outdir', by any rank of the earlier run.
+    # given 'streams', the basenames this run writes, any other stream is
+    # closed off (see close_stream)
+    done = set()
+    for path in glob.glob(os.path.join(glob.escape(outdir), prefix + "*" + SUFFIX)):
+        entries = Journal.read(path, truncate=False)
+        done.update(entries)
+        basename = path[:-len(SUFFIX)]
+        if streams is not None and os.path.basename(basename) not in streams:
+            close_stream(basename, entries, targets)
+    return done
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def close_stream(basename, entries, targets=None):
+    # cut a stream of the earlier run that nobody carries on back to the end
+    # of its last journaled directory, as resuming it would, and write an
+    # end-of-archive marker.  with 'targets' it is a sequence of rollover
+    # parts, and the parts after that one are removed
+    part, offset = position(entries)
+    if targets is not None:
+        from rollover import remove_parts
+        remove_parts(os.path.basename(basename), targets, part)
+    elif part is None and os.path.exists(basename + ".tar"):
+        part = basename + ".tar"
+    if part and os.path.exists(part):
+        TarWriter(part, index=os.path.exists(part + ".idx"), resume=offset).close()
+    return
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def position(entries):
+    # (archive part, offset) where the last journaled directory ended, or
+    # (None, 0) for a new stream
+    if not entries: return (None, 0)
+    offset, _, part = next(reversed(entries.values())).partition(' ')
+    return (part, int(offset))
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def open_archive(basename, get_option):
+    # (TarWriter, ArchiveJournal) for a single archive stream, carried on
+    # from its journal on restart.  no journal when journaling is off
+    if not enabled(get_option): return open_tar(basename, get_option), None
+    journal = ArchiveJournal(basename, get_option)
+    part, offset = journal.position()
+    journal.tar = open_tar(basename, get_option, resume=offset if part else None)
+    return journal.tar, journal
+
+
+
+################################################################################
+class ArchiveJournal(Journal):
+    """ The directories completed in one archive stream, '<basename>'. """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, basename, get_option):
+        if get_option('compress', ''):
+            raise ValueError("TASK_RUNNER_DIR_JOURNAL and _RESTART need uncompressed archives")
+        Journal.__init__(self, basename + SUFFIX,
+                         restart      = get_option('restart', False),
+                         sync_records = get_option('journal_sync_records', 64),
+                         sync_seconds = get_option('journal_sync_seconds', 5.),
+                         before_sync  = self.sync_tar)
+        self.tar = None
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def sync_tar(self):
+        # the archive part the records point into goes first
+        if self.tar: self.tar.sync()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def completed(self, dirname, tar):
+        # all of 'dirname' is now in TarWriter 'tar'
+        self.tar = tar
+        self.record(dirname, "{} {}".format(tar.offset, tar.name))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def position(self):
+        return position(self.entries)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+from array import array
+import os
+
+# window header, int64 words at these byte offsets
+LOCK    = 0     # 0 free, else held (rank+1 of some contender)
+HEAD    = 8     # first slot still to be taken
+TAIL    = 16    # one past the last published slot
+PENDING = 24    # rank 0 only: directories discovered but not yet scanned
+HEADER  = 32
+SLOT    = 16    # (arena offset, length) int64 pair
+
+
+
+################################################################################
+class RMAQueue:
+    """ Work sharing through one-sided MPI, without victim participation.
+
+    Every rank exposes a window holding a header, a table of 'nslots'
+    slots and an 'arena' of path bytes.  The owner keeps most of its work
+    in a private list and publish()es a share of it into the window when
+    the window is empty; any rank can then steal() from the head of the
+    published range, under a test-and-set spin lock (an atomic swap with
+    Fetch_and_op), using Get/Put on the slots and arena and atomic
+    reads/writes of head & tail.  reclaim() is the owner taking back
+    whatever is left when it runs out.  Under its own lock the owner uses
+    plain loads and stores on its window memory instead of RMA to itself.
+
+    Compare_and_swap is avoided: Open MPI 4.1's vader BTL segfaults on it.
+
+    Termination uses a global count of pending directories at PENDING on
+    rank 0.  Each rank accumulates (discovered - scanned) locally and adds
+    it to the count before publishing work (so nothing stealable is
+    uncounted) and whenever it runs idle; the count reaching zero means
+    there is no work left anywhere.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, comm, nslots=4096, arena=4*1024*1024, pending=0):
+        self.comm   = comm
+        self.rank   = comm.Get_rank()
+        self.nslots = nslots
+        self.arena  = arena
+        self.base   = HEADER + SLOT*nslots
+        # window memory from MPI, so it can be registered for RDMA
+        self.win    = MPI.Win.Allocate(HEADER + SLOT*nslots + arena, disp_unit=1, comm=comm)
+        mem = self.win.tomemory()
+        mem[:HEADER] = array('q', [0, 0, 0, pending if self.rank == 0 else 0]).tobytes()
+        # our own window, as bytes and as int64 words, in the unified model
+        self.local  = (self.win.model == MPI.WIN_UNIFIED)
+        self.mem    = memoryview(mem).cast('B')
+        self.words  = self.mem[:HEADER].cast('q')
+        comm.Barrier()
+        self.win.Lock_all()
+        self.delta  = 0
+        self.one    = array('q', [self.rank+1])
+        self.result = array('q', [0])
+        self.lock_fails = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def free(self):
+        self.words.release()
+        self.mem.release()
+        self.win.Unlock_all()
+        self.win.Free()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def fetch(self, rank, disp, value=0, op=MPI.NO_OP):
+        # atomic read (or op) of one int64 word
+        self.win.Fetch_and_op([array('q', [value]), MPI.INT64_T], [self.result, MPI.INT64_T], rank, disp, op)
+        self.win.Flush(rank)
+        return self.result[0]
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def store(self, rank, disp, value):
+        self.win.Accumulate([array('q', [value]), MPI.INT64_T], rank, (disp, 1, MPI.INT64_T), MPI.REPLACE)
+        self.win.Flush(rank)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def lock(self, rank, tries=1):
+        # test-and-set: swapping in a non-zero word over a held lock
+        # leaves it held, so only a 0 back means we got it
+        for t in range(tries):
+            self.win.Fetch_and_op([self.one, MPI.INT64_T], [self.result, MPI.INT64_T],
+                                  rank, LOCK, MPI.REPLACE)
+            self.win.Flush(rank)
+            if self.result[0] == 0:
+                if rank == self.rank: self.win.Sync()
+                return True
+        self.lock_fails += 1
+        return False
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def unlock(self, rank):
+        if rank == self.rank: self.win.Sync()
+        self.store(rank, LOCK, 0)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def read(self, rank, disp):
+        # header word, with 'rank's lock held
+        if rank == self.rank and self.local: return self.words[disp//8]
+        return self.fetch(rank, disp)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def write(self, rank, disp, value):
+        # header word, with 'rank's lock held
+        if rank == self.rank and self.local:
+            self.words[disp//8] = value
+        else:
+            self.store(rank, disp, value)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def get(self, rank, disp, nbytes):
+        if rank == self.rank and self.local: return bytearray(self.mem[disp:disp+nbytes])
+        data = bytearray(nbytes)
+        if nbytes:
+            self.win.Get([data, MPI.BYTE], rank, (disp, nbytes, MPI.BYTE))
+            self.win.Flush(rank)
+        return data
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def put(self, rank, disp, data):
+        if rank == self.rank and self.local:
+            self.mem[disp:disp+len(data)] = data
+        elif data:
+            self.win.Put([data, MPI.BYTE], rank, (disp, len(data), MPI.BYTE))
+            self.win.Flush(rank)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def discovered(self, n):
+        # n new directories queued, one scanned: count locally for now
+        self.delta += n
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def sync_pending(self):
+        # add our local delta to the global count, and return the count
+        val = self.fetch(0, PENDING, self.delta, MPI.SUM) + self.delta
+        self.delta = 0
+        return val
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def publish(self, paths):
+        # offer 'paths' for stealing, if our window is empty.  returns how
+        # many were published (a prefix of 'paths', as many as fit)
+        if not paths or not self.lock(self.rank): return 0
+        n = 0
+        if self.read(self.rank, HEAD) == self.read(self.rank, TAIL):
+            if self.delta: self.sync_pending()
+            slots = array('q')
+            arena = bytearray()
+            for p in paths:
+                b = os.fsencode(p)
+                if n == self.nslots or len(arena) + len(b) > self.arena: break
+                slots.extend((len(arena), len(b)))
+                arena += b
+                n += 1
+            self.put(self.rank, HEADER, slots.tobytes())
+            self.put(self.rank, self.base, arena)
+            self.write(self.rank, HEAD, 0)
+            self.write(self.rank, TAIL, n)
+        self.unlock(self.rank)
+        return n
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def take(self, rank, fraction):
+        # with 'rank's lock held: take 'fraction' (rounded up) of its
+        # published paths, from the head
+        head = self.read(rank, HEAD)
+        tail = self.read(rank, TAIL)
+        if head >= tail: return []
+        n = max(1, int((tail - head)*fraction + 0.5))
+        slots = array('q')
+        slots.frombytes(self.get(rank, HEADER + SLOT*head, SLOT*n))
+        self.write(rank, HEAD, head + n)
+        lo = slots[0]
+        hi = slots[-2] + slots[-1]
+        arena = self.get(rank, self.base + lo, hi - lo)
+        return [ os.fsdecode(bytes(arena[slots[2*i]-lo : slots[2*i]-lo+slots[2*i+1]])) for i in range(n) ]
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def steal(self, victim, fraction=0.5):
+        # returns the stolen paths, [] if there was nothing or the victim
+        # was locked
+        if not self.lock(victim): return []
+        try:
+            return self.take(victim, fraction)
+        finally:
+            self.unlock(victim)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def reclaim(self):
+        # take back everything still published in our own window
+        if not self.lock(self.rank, tries=100): return []
+        try:
+            return self.take(self.rank, 1.)
+        finally:
+            self.unlock(self.rank)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tarwriter import open_tar, RECORDSIZE
+
+#                    b       k      M      G      T
+DEFAULT_MAX_BYTES =  2  * 1024 * 1024 * 1024 * 1024
+
+
+
+################################################################################
+def remove_parts(prefix, targets, part=None):
+    """ remove the parts '<target>/<prefix>-f<N>.tar*' numbered after
+    'part' (all of them for None), returning part's number or -1 """
+    count = -1
+    if part:
+        count = int(re.search(r'-f(\d+)\.tar$', part).group(1))
+    for target in targets:
+        for name in glob.glob(os.path.join(glob.escape(target), prefix + "-f*.tar*")):
+            m = re.search(r'-f(\d+)\.tar', name)
+            if m and int(m.group(1)) > count: os.unlink(name)
+    return count
+
+
+
+################################################################################
+class Rollover:
+    """ Sequence of archive parts '<target>/<prefix>-f<N>.tar[.gz|.zst]'.
+
+    writer(nbytes) returns the part to add the next member to, first
+    starting a new part if the current one already holds max_members, is
+    older than max_age seconds, or would pass max_bytes with 'nbytes' more
+    (the end-of-archive trailer included).  A part is never empty, so a
+    member larger than max_bytes gets a part to itself.  Sizes are of the
+    uncompressed tar stream.
+
+    Parts are spread over 'targets' (directories, e.g. on different OSTs)
+    round-robin, starting at an offset by rank, or to the one with the most
+    free space ('freespace').  With preopen the next part is created on a
+    background thread while the current one is being written, and removed
+    again by close() if it was never needed.
+
+    'max_bytes' and 'targets' are defaults for the options of the same
+    name, and 'closed', if given, is called with each part once it is
+    complete.  With a 'journal' (see resume.py) each part is synced with
+    it before being closed, and resume() carries on where it left off.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, prefix, get_option, rank=0, max_bytes=DEFAULT_MAX_BYTES, targets='.', closed=None, journal=None):
+        self.prefix      = prefix
+        self.get_option  = get_option
+        self.rank        = rank
+        self.max_bytes   = get_option('archive_max_bytes',   max_bytes)
+        self.max_members = get_option('archive_max_members', 0)
+        self.max_age     = get_option('archive_max_age',     0.)
+        self.stripe      = get_option('archive_stripe',      'roundrobin')
+        self.targets     = [t for t in get_option('archive_targets', targets).split(':') if t] or ['.']
+        self.closed      = closed
+        self.journal     = journal
+        self.count       = 0
+        self.tar         = None
+        self.topen       = None
+        self.next        = None
+        self.pool        = ThreadPoolExecutor(max_workers=1) if get_option('archive_preopen', True) else None
+        if self.stripe not in ('roundrobin', 'freespace'):
+            raise ValueError("unknown TASK_RUNNER_ARCHIVE_STRIPE '{}'".format(self.stripe))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def target(self, n):
+        if self.stripe == 'freespace' and len(self.targets) > 1:
+            def avail(t):
+                st = os.statvfs(t)
+                return st.f_bavail * st.f_frsize
+            return max(self.targets, key=avail)
+        return self.targets[(self.rank + n) % len(self.targets)]
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def open(self, n):
+        return open_tar(os.path.join(self.target(n), "{}-f{}".format(self.prefix, n)), self.get_option)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def full(self, nbytes):
+        tar = self.tar
+        if not tar.nmembers: return False
+        if self.max_members and tar.nmembers >= self.max_members: return True
+        if self.max_age and time.time() - self.topen >= self.max_age: return True
+        return tar.offset + nbytes + RECORDSIZE > self.max_bytes
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def writer(self, nbytes=0):
+        if self.tar and not self.full(nbytes): return self.tar
+
+        if self.tar:
+            if self.journal: self.journal.sync()
+            self.tar.close()
+            if self.closed: self.closed(self.tar)
+            self.count += 1
+        if self.next:
+            self.tar = self.next.result()
+        else:
+            self.tar = self.open(self.count)
+        self.topen = time.time()
+        self.next = self.pool.submit(self.open, self.count+1) if self.pool else None
+        return self.tar
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def resume(self, part, offset):
+        # carry on archive 'part' from 'offset', removing any later parts of
+        # ours, which hold nothing journaled.  part None starts over
+        count = remove_parts(self.prefix, self.targets, part)
+        if part:
+            self.tar   = open_tar(part[:-len(".tar")], self.get_option, resume=offset)
+            self.count = count
+            self.topen = time.time()
+            if self.journal: self.journal.tar = self.tar
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        if self.tar:
+            self.tar.close()
+            if self.closed: self.closed(self.tar)
+            self.tar = None
+        if self.next:
+            self.next.result().discard()
+            self.next = None
+        if self.pool: self.pool.shutdown()
+        return
@@ -1,22 +1,29 @@
 #!/usr/bin/env python
 
-from mpi4py import MPI
-from master import Master
-from slave import Slave
+# worker processes of TASK_RUNNER_POOL_MODE=process import this file as
+# their main module, and must not initialize MPI
+if __name__ == "__main__":
+    from mpi4py import MPI
+    import bundle
+    bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
+    from master import Master
+    from slave import Slave
 
-comm = MPI.COMM_WORLD
-rank = comm.Get_rank()
-size = comm.Get_size()
-assert size > 1
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    assert size > 1
 
-# slaves on ranks [1,size)
-if rank:
-    slave = Slave()
-    slave.run()
+    # slaves on ranks [1,size)
+    if rank:
+        slave = Slave()
+        slave.run()
+        slave.gather_log()
 
-# master on rank 0
-else:
-    options = set(['archive'])
+    # master on rank 0
+    else:
+        options = set(['archive'])
 
-    master = Master(options)
-    master.run()
+        master = Master(options)
+        master.run()
+        master.gather_log()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+import os
+import queue
+import socket
+import threading
+import time
+
+
+
+################################################################################
+class Batch:
+    """ A named list of tasks, and what to do with the results once every
+    task has one. """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, name, tasks, reply):
+        self.name      = name
+        self.tasks     = tasks
+        self.reply     = reply
+        self.remaining = len(tasks)
+        self.results   = []
+        self.tstart    = time.time()
+        return
+
+
+
+################################################################################
+class TaskService:
+    """ Control channel for a long-lived master: batches of tasks arrive on
+    background threads from
+
+      - a drop directory: a file '<name>.batch' (written elsewhere and
+        renamed in, one task per line) is taken and removed, and once all
+        its tasks are done '<name>.done' appears with one result per line.
+        A file named 'shutdown' stops the service.
+      - a UNIX socket: a client sends one task per line and closes its
+        sending side; the results come back one per line when done.  The
+        single line 'shutdown' stops the service.
+
+    get() hands out (batch, task) pairs in arrival order and complete()
+    collects results.  stopped() is true once a shutdown was requested, the
+    threads have queued what they had already picked up, and every queued
+    task has been handed out.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, dropdir=None, socket_path=None, poll=0.05):
+        self.dropdir     = dropdir
+        self.socket_path = socket_path
+        self.poll        = poll
+        self.queue       = queue.Queue()
+        self.stop        = threading.Event()
+        self.nbatches    = 0
+        self.threads     = []
+
+        if dropdir:
+            os.makedirs(dropdir, exist_ok=True)
+            self.threads.append(threading.Thread(target=self.watch_dir, daemon=True))
+        if socket_path:
+            if os.path.exists(socket_path): os.unlink(socket_path)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.bind(socket_path)
+            self.sock.listen(16)
+            self.sock.settimeout(poll)
+            self.threads.append(threading.Thread(target=self.serve_socket, daemon=True))
+        for t in self.threads: t.start()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def submit(self, name, tasks, reply):
+        batch = Batch(name, tasks, reply)
+        self.nbatches += 1
+        if not tasks:
+            reply(batch)
+        for task in tasks:
+            self.queue.put((batch, task))
+        return batch
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout) if timeout else self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def complete(self, batch, result):
+        # returns the batch if this was its last task
+        batch.results.append(result)
+        batch.remaining -= 1
+        if batch.remaining: return None
+        batch.reply(batch)
+        return batch
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def stopped(self):
+        # the threads finish the pass they are in before they see 'stop'
+        return (self.stop.is_set() and not any(t.is_alive() for t in self.threads)
+                and self.queue.empty())
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    @staticmethod
+    def parse(text):
+        return [ l.strip() for l in text.splitlines() if l.strip() and not l.lstrip().startswith('#') ]
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def watch_dir(self):
+        while not self.stop.is_set():
+            # every batch in the listing is queued before a shutdown in it
+            # takes effect
+            names = sorted(os.listdir(self.dropdir))
+            for f in names:
+                if f.endswith('.batch'):
+                    path = os.path.join(self.dropdir, f)
+                    with open(path) as inp: tasks = self.parse(inp.read())
+                    os.unlink(path)
+                    self.submit(f[:-len('.batch')], tasks, self.reply_file)
+            if 'shutdown' in names:
+                os.unlink(os.path.join(self.dropdir, 'shutdown'))
+                self.stop.set()
+            self.stop.wait(self.poll)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def reply_file(self, batch):
+        # written under a temporary name, so '<name>.done' appears complete
+        done = os.path.join(self.dropdir, batch.name + ".done")
+        with open(done + ".tmp", 'w') as out:
+            for r in batch.results: out.write("{}\n".format(r))
+        os.rename(done + ".tmp", done)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def serve_socket(self):
+        while not self.stop.is_set():
+            try:
+                conn, addr = self.sock.accept()
+            except socket.timeout:
+                continue
+            conn.settimeout(None)
+            data = []
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk: break
+                data.append(chunk)
+            tasks = self.parse(b''.join(data).decode())
+            if tasks == ['shutdown']:
+                conn.sendall(b"shutdown\n")
+                conn.close()
+                self.stop.set()
+            else:
+                self.submit("socket-{}".format(self.nbatches), tasks,
+                            lambda batch, conn=conn: self.reply_socket(batch, conn))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def reply_socket(self, batch, conn):
+        try:
+            conn.sendall("".join("{}\n".format(r) for r in batch.results).encode())
+        except OSError:
+            pass
+        conn.close()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        self.stop.set()
+        for t in self.threads: t.join()
+        if self.socket_path:
+            self.sock.close()
+            if os.path.exists(self.socket_path): os.unlink(self.socket_path)
+        return
@@ -2,10 +2,12 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
-import tarfile
+import glob
 import os
 import shutil
-from write_rand_data import *
+import time
+from collections import deque
+from write_rand_data import write_rand_data, write_step
 
 
 ################################################################################
@@ -17,12 +19,85 @@ class Slave(MPIClass):
 
         self.instruct = None;
         self.tar = None;
+        self.stager = None;
+        self.moved = None;
         # on first call, have master print our local config. we can do this by sending
         # a note as our first 'result'
         self.result = " Rank {} using local directory {}".format(self.rank, self.local_rankdir)
 
+        # (archive part, task, result) of completed tasks not yet reported.
+        # with a master journal a task is only reported once its output is
+        # durable, see release()
+        self.held = [ (None, None, self.result) ]
+        self.durable = bool(self.get_option('journal', '')) and not (
+            self.get_option('serve_dir') or self.get_option('serve_socket'))
+
         # process options. open any files thay belong in shared run directory.
-        if "archive" in self.options: self.tar = tarfile.open("output-{:05d}.tar".format(self.rank), "w")
+        if "archive" in self.options:
+            if self.get_option('stage', False):
+                self.init_staging()
+            else:
+                from tarwriter import open_tar
+                self.tar = open_tar(self.archive_name(), self.get_option)
+
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def archive_name(self):
+        # a restarted run adds new archives, '-r<N>', rather than overwrite
+        # those holding the tasks already done.  those are cut back to their
+        # last complete member, in case the run writing them crashed
+        name = "output-{:05d}".format(self.rank)
+        if not self.get_option('restart', False): return name
+        n = 0
+        base = name
+        while glob.glob(os.path.join(self.rundir, name + ".*")) or glob.glob(os.path.join(self.rundir, name + "-f*")):
+            self.cut_back(os.path.join(self.rundir, name))
+            n += 1
+            name = "{}-r{}".format(base, n)
+        return name
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def cut_back(self, path):
+        # parts that were staged are moved whole, so only a plain archive
+        # can be torn.  compressed ones cannot be cut
+        from tarwriter import cut_back
+        if os.path.exists(path + ".tar"):
+            nmembers = cut_back(path + ".tar")
+            self.log(self.LOG_INFO, "rank {} kept {} members of {}.tar", self.rank, nmembers, path)
+        for name in glob.glob(glob.escape(path) + ".tar.*"):
+            if not name.endswith((".idx", ".chunks")):
+                self.log(self.LOG_ERROR, "rank {} cannot cut back compressed {}, a task interrupted in it may be incomplete",
+                         self.rank, name)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_staging(self):
+        # archive parts are written to node-local storage ('stage_dir', or
+        # the SLURM job tmpfs/local directory) and rolled over every
+        # 'stage_part_bytes' (between tasks), then moved to the run directory
+        # in the background.  tasks wait while more than 'stage_max_bytes'
+        # are still to be moved, or the local file system is short of room
+        # for another part
+        from rollover import Rollover
+        from staging import Stager
+        part_bytes  = self.get_option('stage_part_bytes', 1024**3)
+        self.stager = Stager(self.rundir,
+                             topdir    = self.get_option('stage_dir', self.local_topdir),
+                             prefix    = "stage{}_".format(self.rank),
+                             max_bytes = self.get_option('stage_max_bytes', 4*1024**3),
+                             min_free  = part_bytes)
+        self.tar    = Rollover(self.archive_name(), self.get_option, self.rank,
+                               max_bytes = part_bytes,
+                               targets   = self.stager.stagedir,
+                               closed    = self.stager.drain)
+        self.moved  = self.stager.moved
 
         return
 
@@ -38,33 +113,237 @@ class Slave(MPIClass):
             stepdir="{}/{}".format(self.local_rankdir, self.instruct)
             os.mkdir(stepdir)
             os.chdir(stepdir)
-            write_rand_data()
+            write_rand_data(nthreads=self.get_option('write_threads', 1),
+                            compressible=self.get_option('compressible', False))
             os.chdir(self.local_rankdir)
-            if self.tar:
-                self.tar.add(self.instruct)
-            shutil.rmtree(stepdir,ignore_errors=True)
+            self.archive_step(self.instruct)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def archive_step(self, step):
+        # tar up the 'step' directory (from within local_rankdir), then
+        # clean up our mess
+        if self.stager:
+            self.stager.throttle()
+            self.tar.writer().add_tree(step)
+        elif self.tar:
+            self.tar.add_tree(step)
+        shutil.rmtree(os.path.join(self.local_rankdir, step), ignore_errors=True)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def hold(self, task, result):
+        # a completed task, to report once release()d
+        part = self.tar.tar.name if self.stager and self.tar.tar else None
+        self.held.append((part, task, result))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def release(self):
+        # (task, result) of the held tasks we can report now.  when
+        # 'durable', that is those in an archive synced to disk (a
+        # compressed one to a chunk boundary), or with staging, in a part
+        # the mover has moved to the run directory.  the master journals a
+        # reported task, so it must not be lost in a crash
+        if self.durable:
+            if self.moved is not None:
+                ready = [ (t, r) for p, t, r in self.held if p is None or p in self.moved ]
+                self.held = [ h for h in self.held if not (h[0] is None or h[0] in self.moved) ]
+                return ready
+            if self.tar and self.held: self.tar.sync()
+        ready = [ (t, r) for p, t, r in self.held ]
+        self.held = []
+        return ready
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close_staging(self):
+        # wait for the mover to drain everything, then report
+        st = self.stager
+        st.close()
+        for err in st.errors:
+            self.log(self.LOG_ERROR, "rank {} could not move {}", self.rank, err)
+        self.log(self.LOG_INFO, "rank {} staged {} files, {:.5e} bytes, moved in {:.3f} sec., throttled {:.3f} sec.",
+                 self.rank, st.nmoved, st.bytes_moved, st.move_time, st.wait_time)
+        self.stager = None
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def finalize(self):
+        # close the archive, syncing it first or, with staging, waiting for
+        # every part to be moved, then report any held task that is lost
+        if self.tar:
+            if self.durable and not self.stager: self.tar.sync()
+            self.tar.close()
+        if self.stager: self.close_staging()
+        lost = [ t for p, t, r in self.held if p is not None and p not in self.moved ]
+        if lost:
+            self.log(self.LOG_ERROR, "rank {} not reporting {} tasks, their archive part was not moved: {}",
+                     self.rank, len(lost), " ".join(lost))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run_node(self):
+        # node queue mode: take tasks from a queue shared by the slaves on
+        # our node (see nodequeue.py).  whichever finds it running low asks
+        # the master for a batch of 'node_batch' tasks to refill it, and
+        # results go back in batches of as many
+        from nodequeue import NodeQueue, EMPTY, FINISHED
+        node = self.comm.Split(0, self.rank).Split_type(MPI.COMM_TYPE_SHARED)
+        queue = NodeQueue(node, nslots     = self.get_option('node_slots', 1024),
+                                slot_bytes = self.get_option('node_slot_bytes', 256))
+        nbatch = max(1, self.get_option('node_batch', 4*node.Get_size()))
+        low  = node.Get_size()
+        poll = self.get_option('node_poll', 0.001)
+
+        requests = []
+        nrefills = 0
+        while True:
+            task, left = queue.take()
+            if task is FINISHED: break
+
+            # refill, if nobody else on the node is already
+            if (task is EMPTY or left < low) and queue.claim_refill():
+                n = min(nbatch, queue.room())
+                if n:
+                    self.comm.send(n, dest=0, tag=self.tags['refill'])
+                    tasks = self.comm.recv(source=0, tag=self.tags['refill'])
+                    if tasks: queue.push(tasks)
+                    else: queue.finish()
+                    nrefills += 1
+                queue.release_refill()
+
+            if task is EMPTY:
+                time.sleep(poll)
+                continue
+
+            self.instruct = task
+            tstart = MPI.Wtime()
+            self.run_serial_task()
+            self.hold(task, "  rank {} completed {} in {} sec.".format(self.rank,
+                                                                    task,
+                                                                    round(MPI.Wtime() - tstart,5)))
+            if len(self.held) >= nbatch:
+                results = self.release()
+                if results:
+                    requests.append(self.comm.isend((results, False), dest=0, tag=self.tags['results']))
+
+        # our last results, which tells the master we are done
+        self.finalize()
+        requests.append(self.comm.isend((self.release(), True), dest=0, tag=self.tags['results']))
+        MPI.Request.waitall(requests)
+        self.log(self.LOG_DEBUG, "rank {} refilled its node queue {} times, {} lock conflicts",
+                 self.rank, nrefills, queue.lock_fails)
+        queue.free()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run_pool(self):
+        # hybrid mode: 'pool' workers, threads or processes ('pool_mode'),
+        # run tasks from a local queue, refilled from the master with
+        # batches of 'pool_batch' tasks (as Master.run_batches serves the
+        # node queue).  we archive each task as it finishes, while the
+        # workers carry on, and send results back in batches as large
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+        from functools import partial
+        import multiprocessing
+        nworkers = self.get_option('pool', 1)
+        # worker processes come from a forkserver, never a fork of this
+        # process with MPI initialized
+        executor = { 'thread'  : ThreadPoolExecutor,
+                     'process' : partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('forkserver'))
+                   }[self.get_option('pool_mode', 'thread')]
+        nbatch = max(1, self.get_option('pool_batch', 2*nworkers))
+        nthreads = self.get_option('write_threads', 1)
+        compressible = self.get_option('compressible', False)
+
+        os.chdir(self.local_rankdir)
+        local = deque()
+        running = {}            # future : (task, submit time)
+        finished = []
+        requests = []
+        more = True
+        with executor(max_workers=nworkers) as pool:
+            while True:
+                # refill once fewer tasks are waiting than we have workers
+                if more and len(local) < nworkers:
+                    self.comm.send(nbatch, dest=0, tag=self.tags['refill'])
+                    tasks = self.comm.recv(source=0, tag=self.tags['refill'])
+                    local.extend(tasks)
+                    more = bool(tasks)
+
+                while local and len(running) < nworkers:
+                    task = local.popleft()
+                    running[pool.submit(write_step, self.local_rankdir, task, nthreads, compressible)] = (task, MPI.Wtime())
+
+                for task, tstart in finished:
+                    self.archive_step(task)
+                    self.hold(task, "  rank {} completed {} in {} sec.".format(self.rank,
+                                                                            task,
+                                                                            round(MPI.Wtime() - tstart,5)))
+                finished = []
+                if len(self.held) >= nbatch:
+                    results = self.release()
+                    if results:
+                        requests.append(self.comm.isend((results, False), dest=0, tag=self.tags['results']))
+
+                if not running: break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for f in done:
+                    f.result()
+                    finished.append(running.pop(f))
+
+        # our last results, which tells the master we are done
+        self.finalize()
+        requests.append(self.comm.isend((self.release(), True), dest=0, tag=self.tags['results']))
+        MPI.Request.waitall(requests)
         return
 
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def run(self):
+        if self.get_option('pool', 0):
+            return self.run_pool()
+        if self.get_option('node_queue', False):
+            return self.run_node()
+
         status = MPI.Status()
         while True:
-            # signal Master we are ready for the next task. We can do this
-            # asynchronously, without a request, because we can infer completion
-            # with the subsequent recv.
-            self.comm.isend(self.result, dest=0, tag=self.tags['ready'])
+            # signal Master we are ready for the next task, with the
+            # (task, result) we can report. We can do this asynchronously,
+            # without a request, because we can infer completion with the
+            # subsequent recv.
+            self.comm.isend(self.release(), dest=0, tag=self.tags['ready'])
 
             # receive instructions from Master
             self.instruct = self.comm.recv(source=0, tag=MPI.ANY_TAG, status=status)
 
-            # choose proper action based on message tag
-            if status.Get_tag() == self.tags['terminate']: return
+            # choose proper action based on message tag.  with a journal,
+            # what we still held goes last, once the archive is closed (and
+            # with timeouts, so the master knows we are through)
+            if status.Get_tag() == self.tags['terminate']:
+                self.finalize()
+                if self.durable or self.get_option('task_timeout', 0.):
+                    self.comm.send((self.release(), True), dest=0, tag=self.tags['results'])
+                return
 
             tstart = MPI.Wtime()
             self.run_serial_task()
-            self.result = "  rank {} completed {} in {} sec.".format(self.rank,
-                                                                     self.instruct,
-                                                                     round(MPI.Wtime() - tstart,5))
+            self.hold(self.instruct, "  rank {} completed {} in {} sec.".format(self.rank,
+                                                                             self.instruct,
+                                                                             round(MPI.Wtime() - tstart,5)))
         return
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+
+
+
+################################################################################
+class Stager:
+    """ Node-local staging area for finished output files, with a background
+    thread moving them to 'destdir' (the shared run directory).
+
+    drain(path) queues a closed file, together with its .idx / .chunks
+    sidecars, for the mover.  Each is copied whole (shutil.copyfile, which
+    uses sendfile) to '<name>.part' in destdir and renamed into place, so
+    a file never appears there half written, then removed locally.  The
+    paths moved so far are in 'moved'.
+
+    throttle() is the capacity control: it blocks while more than
+    'max_bytes' are waiting to be drained, or while the staging file
+    system has less than 'min_free' bytes available and the mover still
+    has something to free.
+    """
+
+    sidecars = ('.idx', '.chunks')
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, destdir, topdir=None, prefix="stage_", max_bytes=4*1024**3, min_free=0):
+        self.destdir   = destdir
+        self.stagedir  = tempfile.mkdtemp(prefix=prefix, dir=topdir)
+        self.max_bytes = max_bytes
+        self.min_free  = min_free
+        self.cond      = threading.Condition()
+        self.files     = deque()
+        self.nbytes    = 0
+        self.done      = False
+        self.errors    = []
+        self.moved     = set()
+
+        # statistics
+        self.nmoved     = 0
+        self.bytes_moved = 0
+        self.move_time  = 0.
+        self.wait_time  = 0.
+
+        self.thread = threading.Thread(target=self.mover, daemon=True)
+        self.thread.start()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def free(self):
+        st = os.statvfs(self.stagedir)
+        return st.f_bavail * st.f_frsize
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def drain(self, path):
+        # accepts a path or anything with a 'name', e.g. a closed TarWriter
+        path  = getattr(path, 'name', path)
+        paths = [path] + [ path + s for s in self.sidecars if os.path.exists(path + s) ]
+        with self.cond:
+            for p in paths:
+                size = os.path.getsize(p)
+                self.files.append((p, size))
+                self.nbytes += size
+            self.cond.notify_all()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def throttle(self):
+        tstart = time.time()
+        with self.cond:
+            while self.files and (self.nbytes > self.max_bytes or
+                                  (self.min_free and self.free() < self.min_free)):
+                self.cond.wait(1.)
+        self.wait_time += time.time() - tstart
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def mover(self):
+        while True:
+            with self.cond:
+                while not self.files and not self.done:
+                    self.cond.wait()
+                if not self.files: return
+                src, size = self.files[0]
+
+            tstart = time.time()
+            dest = os.path.join(self.destdir, os.path.basename(src))
+            moved = False
+            try:
+                shutil.copyfile(src, dest + ".part")
+                fd = os.open(dest + ".part", os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                os.rename(dest + ".part", dest)
+                os.unlink(src)
+                moved = True
+            except OSError as err:
+                # left staged, for the caller to report from 'errors'
+                self.errors.append("{}: {}".format(src, err))
+            self.move_time += time.time() - tstart
+
+            with self.cond:
+                self.files.popleft()
+                self.nbytes -= size
+                if moved:
+                    self.moved.add(src)
+                    self.nmoved += 1
+                    self.bytes_moved += size
+                self.cond.notify_all()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        # wait for everything queued to be drained, then remove the staging
+        # area, unless something failed to move
+        with self.cond:
+            self.done = True
+            self.cond.notify_all()
+        self.thread.join()
+        if not self.errors:
+            shutil.rmtree(self.stagedir, ignore_errors=True)
+        return
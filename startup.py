@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import time
+tstart = time.time()
+
+import argparse
+import os, sys
+import shlex
+import subprocess
+
+
+
+################################################################################
+def probe(args):
+    """ under mpiexec: time MPI initialization, the optional bundle
+    broadcast and the imports, each the maximum over ranks """
+    from mpi4py import MPI
+    tmpi = time.time()
+    import bundle
+    nbundled = bundle.from_env(MPI.COMM_WORLD)
+    tbundle = time.time()
+    for m in args.modules.split(','):
+        __import__(m)
+    timport = time.time()
+
+    comm = MPI.COMM_WORLD
+    launch = float(os.environ.get('STARTUP_T0', tstart))
+    vals = [ comm.reduce(v, op=MPI.MAX, root=0) for v in (tstart - launch, tmpi - tstart,
+                                                         tbundle - tmpi, timport - tbundle,
+                                                         timport - launch) ]
+    if comm.Get_rank() == 0:
+        print("startup launch {:.4f} mpi {:.4f} bundle {:.4f} ({} modules) imports {:.4f} total {:.4f}".format(
+            vals[0], vals[1], vals[2], nbundled, vals[3], vals[4]))
+    return
+
+
+
+################################################################################
+def drive(args):
+    """ run the probe at each rank count, importing from the file system
+    and from a bundle, and tabulate the maxima """
+    print("{:>6s} {:>7s} {:>8s} {:>8s} {:>8s} {:>8s} {:>8s}".format("ranks", "mode", "launch", "mpi", "bundle", "imports", "total"))
+    for nranks in [int(n) for n in args.ranks.split(',')]:
+        for mode in ('files', 'bundle'):
+            for rep in range(args.repeat):
+                env = dict(os.environ)
+                env['STARTUP_T0'] = repr(time.time())
+                if mode == 'bundle': env['TASK_RUNNER_BUNDLE'] = args.bundle
+                else:                env.pop('TASK_RUNNER_BUNDLE', None)
+                cmd = shlex.split(args.mpiexec) + ["-n", str(nranks), sys.executable, os.path.abspath(__file__),
+                                                   "--probe", "--modules", args.modules]
+                out = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout.decode()
+                for line in out.splitlines():
+                    if line.startswith("startup "):
+                        f = line.split()
+                        print("{:6d} {:>7s} {:8.4f} {:8.4f} {:8.4f} {:8.4f} {:8.4f}".format(
+                            nranks, mode, float(f[2]), float(f[4]), float(f[6]), float(f[10]), float(f[12])))
+                        break
+                else:
+                    print(out)
+    return
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure job startup: MPI initialization and module imports, "
+                                                 "from the file system and from a broadcast bundle (see bundle.py).")
+    parser.add_argument("--ranks",   default="2,4", help="comma separated rank counts (default: %(default)s)")
+    parser.add_argument("--repeat",  type=int, default=3, help="runs of each configuration (default: %(default)s)")
+    parser.add_argument("--mpiexec", default="mpiexec", help="MPI launcher command (default: %(default)s)")
+    parser.add_argument("--modules", default="workthief2,tar,echo,master,slave",
+                        help="comma separated modules to import (default: %(default)s)")
+    parser.add_argument("--bundle",  default="1", help="TASK_RUNNER_BUNDLE for the bundle runs (default: %(default)s)")
+    parser.add_argument("--probe",   action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe: probe(args)
+    else:          drive(args)
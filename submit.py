@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import argparse
+import os, sys
+import socket
+import time
+
+
+
+################################################################################
+def submit_dir(dropdir, name, tasks, timeout, poll=0.01):
+    """ drop '<name>.batch' into 'dropdir' and wait for '<name>.done' """
+    batch = os.path.join(dropdir, name + ".batch")
+    done  = os.path.join(dropdir, name + ".done")
+    with open(batch + ".tmp", 'w') as out:
+        for t in tasks: out.write(t + '\n')
+    os.rename(batch + ".tmp", batch)
+
+    tstart = time.time()
+    while not os.path.exists(done):
+        if timeout and time.time() - tstart > timeout:
+            raise TimeoutError("no {} after {} sec.".format(done, timeout))
+        time.sleep(poll)
+    with open(done) as inp: results = inp.read()
+    os.unlink(done)
+    return results
+
+
+
+################################################################################
+def submit_socket(path, tasks, timeout):
+    """ send the tasks over the UNIX socket 'path' and wait for the results """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout or None)
+        s.connect(path)
+        s.sendall("".join(t + '\n' for t in tasks).encode())
+        s.shutdown(socket.SHUT_WR)
+        data = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk: break
+            data.append(chunk)
+    return b''.join(data).decode()
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Submit a batch of tasks to a running task runner "
+                                                 "(TASK_RUNNER_SERVE_DIR / TASK_RUNNER_SERVE_SOCKET) and wait for it.")
+    parser.add_argument("tasks", nargs='*', help="tasks, one per argument (default: one per line on stdin)")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--dir",    help="the runner's drop directory")
+    where.add_argument("--socket", help="the runner's UNIX socket")
+    parser.add_argument("--name",     default="batch-{}-{}".format(os.getpid(), int(time.time())),
+                        help="batch name, for --dir (default: unique)")
+    parser.add_argument("--shutdown", action='store_true', help="ask the runner to finish its queued batches and exit")
+    parser.add_argument("--timeout",  type=float, default=0., help="give up after this many seconds (default: wait forever)")
+    args = parser.parse_args()
+
+    tstart = time.time()
+    if args.shutdown:
+        if args.dir: open(os.path.join(args.dir, 'shutdown'), 'w').close()
+        else:        sys.stdout.write(submit_socket(args.socket, ['shutdown'], args.timeout))
+        sys.exit(0)
+
+    tasks = args.tasks or [ l.strip() for l in sys.stdin if l.strip() ]
+    if args.dir: results = submit_dir(args.dir, args.name, tasks, args.timeout)
+    else:        results = submit_socket(args.socket, tasks, args.timeout)
+    sys.stdout.write(results)
+    sys.stderr.write("{} tasks in {:.4f} sec.\n".format(len(tasks), time.time() - tstart))
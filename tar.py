@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
-import tarfile
+from mpi4py import MPI
+import bundle
+bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
+import os
+import resume
 from workthief2 import WorkThief as Base
 
 otar = None
@@ -8,14 +12,38 @@ otar = None
 ################################################################################
 class TarFiles(Base):
 
+    want_stat = True
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __init__(self):
         self.otar = None
+        self.journal = None
         Base.__init__(self)
         return
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def open_tar(self):
+        # our output tar file, with its journal of completed directories
+        # when journaling or restarting (see resume.py)
+        outdir = self.get_option('output_dir', '.')
+        self.otar, self.journal = resume.open_archive(os.path.join(outdir, "output-{:05d}".format(self.rank)),
+                                                      self.get_option)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def completed_dirs(self):
+        # (collective) on restart, what the earlier run archived
+        if not self.get_option('restart', False): return frozenset()
+        outdir = self.get_option('output_dir', '.')
+        streams = [ "output-{:05d}".format(r) for r in range(self.nranks) ]
+        return self.comm.bcast(resume.completed_dirs(outdir, streams=streams) if self.i_am_root else None)
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def process_directory(self, dirname, statinfo=None):
         Base.process_directory(self,dirname,statinfo)
@@ -31,11 +59,29 @@ class TarFiles(Base):
         Base.process_file(self,filename,statinfo)
 
         # open output tar file if necessary
-        if not self.otar:
-            self.otar = tarfile.open("/ephemeral/benkirk/test_tar_output/output-{:05d}.tar".format(self.rank), "w")
+        if not self.otar: self.open_tar()
 
-        print("[{:3d}] {}".format(self.rank,filename))
-        self.otar.add(filename, recursive=False)
+        self.log(self.LOG_DEBUG, "[{:3d}] {}", self.rank, filename)
+        self.otar.add(filename, statinfo)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def directory_done(self, dirname):
+        if self.journal: self.journal.completed(dirname, self.otar)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run(self):
+        # on restart, cut our archive back to what was journaled even if we
+        # have no files to add this time
+        if self.get_option('restart', False) and not self.otar: self.open_tar()
+        Base.run(self)
+        if self.journal: self.journal.close()
+        if self.otar: self.otar.close()
         return
 
 
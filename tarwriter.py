@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+import os, stat
+import tarfile
+from functools import lru_cache
+from compressor import ChunkCompressor, suffixes, zstandard
+
+try:
+    import pwd, grp
+except ImportError:
+    pwd = grp = None
+
+BLOCKSIZE  = tarfile.BLOCKSIZE
+RECORDSIZE = tarfile.RECORDSIZE
+ENCODING   = tarfile.ENCODING
+NUL        = bytes(BLOCKSIZE)
+
+# buffer size for the read/write fallback copy
+COPY_BUFSIZE = 4*1024*1024
+
+
+
+################################################################################
+@lru_cache(maxsize=None)
+def uname(uid):
+    try:
+        return pwd.getpwuid(uid)[0] if pwd else ''
+    except KeyError:
+        return ''
+
+
+
+################################################################################
+@lru_cache(maxsize=None)
+def gname(gid):
+    try:
+        return grp.getgrgid(gid)[0] if grp else ''
+    except KeyError:
+        return ''
+
+
+
+################################################################################
+def member_size(st):
+    """ archive bytes add() will use for an lstat() result: one header block
+    plus block-padded data.  long names add PAX header blocks on top """
+    size = st.st_size if stat.S_ISREG(st.st_mode) else 0
+    return BLOCKSIZE + size + (-size % BLOCKSIZE)
+
+
+
+################################################################################
+class TarWriter:
+    """ Minimal, fast replacement for tarfile.open(name, "w") + add(path,
+    recursive=False).
+
+    add() takes the stat result the caller already has (e.g. from
+    os.DirEntry.stat()) rather than re-stat'ing, caches uid/gid name
+    lookups, stores integer mtimes so plain members need no extended PAX
+    header, and copies file data into the archive fd in the kernel with
+    os.copy_file_range or os.sendfile when available.  The result is a
+    PAX-format archive that tar and tarfile read as usual.
+
+    With index=True a sidecar '<name>.idx' records one line per member:
+    header offset, data size, and name.
+
+    With compress='gzip' or 'zstd' the stream goes through a ChunkCompressor
+    instead, see compressor.py.  Member starts are offered as chunk
+    boundaries, and .idx offsets are into the uncompressed stream.
+
+    With resume=<offset> an existing uncompressed archive is carried on
+    from 'offset', a member boundary, and whatever follows it (partial
+    members, the old end-of-archive marker) is cut off, from the index too.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, name, index=False, compress=None, level=6, workers=4, chunksize=4*1024*1024, resume=None):
+        if resume is not None and compress:
+            raise ValueError("cannot resume compressed archive {}".format(name))
+        self.name     = name
+        self.offset   = 0
+        self.nmembers = 0
+        self.inodes   = {}
+        self.index    = None
+        self.sink     = None
+        if resume is None:
+            self.fd    = os.open(name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+            self.index = open(name + ".idx", "w") if index else None
+        else:
+            self.fd = os.open(name, os.O_WRONLY | os.O_CREAT, 0o666)
+            os.ftruncate(self.fd, resume)
+            os.lseek(self.fd, resume, os.SEEK_SET)
+            self.offset = resume
+            if index: self.index = self.resume_index(resume)
+
+        # kernel copy methods still to try, dropped as they fail
+        self.copy_methods = []
+        if compress:
+            self.sink = ChunkCompressor(self.fd, name, compress, level, workers, chunksize)
+        else:
+            if hasattr(os, 'copy_file_range'): self.copy_methods.append(self.copy_file_range)
+            if hasattr(os, 'sendfile'):        self.copy_methods.append(self.sendfile)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def resume_index(self, offset):
+        # keep the index lines of members before 'offset', and append
+        lines = []
+        if os.path.exists(self.name + ".idx"):
+            with open(self.name + ".idx", "rb") as f:
+                lines = [ l for l in f if l.endswith(b'\n') and int(l.split(b'\t', 1)[0]) < offset ]
+        with open(self.name + ".idx", "wb") as f:
+            f.writelines(lines)
+        return open(self.name + ".idx", "a")
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __enter__(self):
+        return self
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def write(self, data):
+        if self.sink:
+            self.sink.write(data)
+            self.offset += len(data)
+            return
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+        self.offset += len(data)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def tarinfo(self, path, st, arcname=None):
+        # same member description as tarfile.TarFile.gettarinfo(), from an
+        # existing lstat() result.  returns None for unsupported types (sockets)
+        if arcname is None: arcname = path
+        arcname = os.path.splitdrive(arcname)[1].replace(os.sep, "/").lstrip("/")
+
+        ti = tarfile.TarInfo(arcname)
+        mode = st.st_mode
+        if stat.S_ISREG(mode):
+            inode = (st.st_ino, st.st_dev)
+            if st.st_nlink > 1 and inode in self.inodes and arcname != self.inodes[inode]:
+                ti.type = tarfile.LNKTYPE
+                ti.linkname = self.inodes[inode]
+            else:
+                ti.type = tarfile.REGTYPE
+                ti.size = st.st_size
+                if inode[0]: self.inodes[inode] = arcname
+        elif stat.S_ISDIR(mode):  ti.type = tarfile.DIRTYPE
+        elif stat.S_ISFIFO(mode): ti.type = tarfile.FIFOTYPE
+        elif stat.S_ISLNK(mode):
+            ti.type = tarfile.SYMTYPE
+            ti.linkname = os.readlink(path)
+        elif stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
+            ti.type = tarfile.CHRTYPE if stat.S_ISCHR(mode) else tarfile.BLKTYPE
+            ti.devmajor = os.major(st.st_rdev)
+            ti.devminor = os.minor(st.st_rdev)
+        else:
+            return None
+
+        ti.mode  = mode
+        ti.uid   = st.st_uid
+        ti.gid   = st.st_gid
+        ti.mtime = int(st.st_mtime)
+        ti.uname = uname(st.st_uid)
+        ti.gname = gname(st.st_gid)
+        return ti
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def add(self, path, statinfo=None, arcname=None):
+        # add one member, never recursing into directories.  returns the
+        # number of archive bytes written
+        if statinfo is None: statinfo = os.lstat(path)
+        ti = self.tarinfo(path, statinfo, arcname)
+        if ti is None: return 0
+
+        if self.sink: self.sink.boundary()
+        start = self.offset
+        header = ti.tobuf(tarfile.PAX_FORMAT, ENCODING, "surrogateescape")
+        if ti.size:
+            with open(path, 'rb') as f:
+                self.write(header)
+                self.copy_data(f.fileno(), ti.size)
+        else:
+            self.write(header)
+
+        if self.index:
+            self.index.write("{}\t{}\t{}\n".format(start, ti.size, ti.name))
+        self.nmembers += 1
+        return self.offset - start
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def add_tree(self, top):
+        # add 'top' and everything below it, like tarfile's recursive add(),
+        # using the stat results os.scandir already has
+        nbytes = self.add(top)
+        for di in sorted(os.scandir(top), key=lambda di: di.name):
+            st = di.stat(follow_symlinks=False)
+            if stat.S_ISDIR(st.st_mode): nbytes += self.add_tree(di.path)
+            else:                        nbytes += self.add(di.path, st)
+        return nbytes
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def copy_data(self, src, size):
+        # copy exactly 'size' bytes of 'src' into the archive, then pad to a
+        # block boundary.  if the file shrank underneath us, fill with NULs
+        # so the header stays truthful and the archive stays readable
+        remaining = size
+        while self.copy_methods and remaining:
+            try:
+                n = self.copy_methods[0](src, remaining)
+            except OSError:
+                self.copy_methods.pop(0)
+                continue
+            if n == 0: break
+            self.offset += n
+            remaining -= n
+
+        while remaining:
+            data = os.read(src, min(remaining, COPY_BUFSIZE))
+            if not data: break
+            self.write(data)
+            remaining -= len(data)
+
+        if remaining:
+            self.write(bytes(remaining))
+
+        pad = -size % BLOCKSIZE
+        if pad: self.write(NUL[:pad])
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def copy_file_range(self, src, count):
+        return os.copy_file_range(src, self.fd, count)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def sendfile(self, src, count):
+        return os.sendfile(self.fd, src, None, count)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def sync(self):
+        # everything added so far to stable storage.  a compressed stream
+        # ends its current chunk here, so call between members
+        if self.sink: self.sink.flush()
+        if self.index: self.index.flush()
+        if self.fd is not None: os.fsync(self.fd)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def close(self):
+        # end-of-archive marker, padded to a full record like tarfile
+        if self.fd is None: return
+        self.write(NUL * 2)
+        pad = -self.offset % RECORDSIZE
+        if pad: self.write(bytes(pad))
+        if self.sink:
+            self.sink.close()
+            self.sink = None
+        os.close(self.fd)
+        self.fd = None
+        if self.index:
+            self.index.close()
+            self.index = None
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def discard(self):
+        # close without an end-of-archive marker and remove the archive and
+        # its sidecars, e.g. a part opened ahead of time but never used
+        if self.fd is None: return
+        if self.sink:
+            self.sink.close()
+            self.sink = None
+        os.close(self.fd)
+        self.fd = None
+        if self.index:
+            self.index.close()
+            self.index = None
+        for f in (self.name, self.name + ".idx", self.name + ".chunks"):
+            if os.path.exists(f): os.unlink(f)
+        return
+
+
+
+################################################################################
+def cut_back(name):
+    """ cut uncompressed archive 'name', e.g. one left by a crash, back to
+    its last complete member and close it again with an end-of-archive
+    marker.  returns the number of members kept """
+    size = os.path.getsize(name)
+    end = 0
+    nmembers = 0
+    try:
+        with tarfile.open(name, 'r:') as tf:
+            for ti in tf:
+                last = ti.offset_data + ti.size + (-ti.size % BLOCKSIZE)
+                if last > size: break
+                end = last
+                nmembers += 1
+    except (tarfile.ReadError, EOFError):
+        pass
+    TarWriter(name, index=os.path.exists(name + ".idx"), resume=end).close()
+    return nmembers
+
+
+
+################################################################################
+def open_tar(basename, get_option, resume=None):
+    """ TarWriter for '<basename>.tar', configured from the task runner
+    options (TASK_RUNNER_TAR_INDEX, _COMPRESS, _COMPRESS_LEVEL,
+    _COMPRESS_WORKERS, _COMPRESS_CHUNK).  Compressed archives get a .gz or
+    .zst suffix; zstd falls back to gzip without the zstandard module.
+    'resume' is passed on to carry on an existing archive. """
+    compress = get_option('compress', '') or None
+    if compress == 'zstd' and zstandard() is None: compress = 'gzip'
+    name = basename + ".tar"
+    if compress:
+        if compress not in suffixes:
+            raise ValueError("unknown TASK_RUNNER_COMPRESS '{}'".format(compress))
+        name += suffixes[compress]
+    return TarWriter(name,
+                     index     = get_option('tar_index', False),
+                     compress  = compress,
+                     level     = get_option('compress_level', 6 if compress != 'zstd' else 3),
+                     workers   = get_option('compress_workers', 4),
+                     chunksize = get_option('compress_chunk', 4*1024*1024),
+                     resume    = resume)
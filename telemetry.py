@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+import numpy as np
+import sys
+
+
+
+################################################################################
+class Telemetry:
+    """ Periodic, nonblocking global progress report.
+
+    Every 'interval' seconds each rank posts an Ireduce of its counters
+    to rank 0 on a private duplicate communicator.  Ranks post on their own
+    clocks and never wait; the reductions are matched in order, so a slow
+    rank simply contributes a slightly older snapshot.  Rank 0 prints a
+    one-line status (or appends it to 'outfile') whenever a reduction
+    completes.  Call poll() from the work loop and finalize() once, on all
+    ranks, when done.
+    """
+
+    # counters reduced (summed) across ranks
+    fields = ('files', 'bytes', 'dirs', 'pending', 'idle', 'steal_tries', 'steal_hits')
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, comm, sample, interval=10., outfile=None):
+        # 'sample' is a callable returning a tuple ordered like 'fields'.
+        # it is only invoked when posting a reduction, not on every poll
+        self.parent   = comm
+        self.comm     = comm.Dup()
+        self.rank     = self.comm.Get_rank()
+        self.nranks   = self.comm.Get_size()
+        self.sample   = sample
+        self.interval = interval
+        self.outfile  = outfile
+        self.out      = None
+
+        self.sendbuf = np.zeros(len(self.fields), dtype=np.float64)
+        self.recvbuf = np.zeros(len(self.fields), dtype=np.float64)
+        self.request = None
+        self.nposted = 0
+
+        self.tstart = MPI.Wtime()
+        self.tnext  = self.tstart + self.interval
+        self.tlast  = self.tstart
+        self.last   = np.zeros(len(self.fields), dtype=np.float64)
+
+        if self.rank == 0:
+            self.out = open(self.outfile, 'a', buffering=1) if self.outfile else sys.stdout
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def post(self):
+        self.sendbuf[:] = self.sample()
+        self.request = self.comm.Ireduce(self.sendbuf, self.recvbuf, op=MPI.SUM, root=0)
+        self.nposted += 1
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def poll(self):
+        # cheap enough to call every loop iteration: a Wtime() and, with a
+        # reduction in flight, a Test()
+        if self.request is not None:
+            if not self.request.Test(): return
+            self.request = None
+            if self.rank == 0: self.report()
+
+        now = MPI.Wtime()
+        if now >= self.tnext:
+            self.tnext = now + self.interval
+            self.post()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def finalize(self):
+        # collective. first agree (on the parent communicator, so as not to
+        # disturb the ordering of reductions in flight) on how many reductions
+        # were posted, then complete ours and post however many this rank is
+        # behind so all ranks have matched the same number.  Waiting before
+        # agreeing could deadlock against a rank that has not yet posted.
+        nmax = self.parent.allreduce(self.nposted, op=MPI.MAX)
+
+        if self.request is not None:
+            self.request.Wait()
+            self.request = None
+            if self.rank == 0: self.report()
+
+        while self.nposted < nmax:
+            self.post()
+            self.request.Wait()
+            self.request = None
+
+        self.sendbuf[:] = self.sample()
+        self.comm.Reduce(self.sendbuf, self.recvbuf, op=MPI.SUM, root=0)
+        if self.rank == 0:
+            self.report(final=True)
+            if self.out is not sys.stdout: self.out.close()
+            self.out = None
+        self.comm.Free()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def report(self, final=False):
+        # rates are over the last interval, or the whole run for the final report
+        now = MPI.Wtime()
+        dt  = max(now - (self.tstart if final else self.tlast), 1.e-9)
+        cur = dict(zip(self.fields, self.recvbuf))
+        rate = (self.recvbuf - (0. if final else self.last)) / dt
+        rate = dict(zip(self.fields, rate))
+        tries = cur['steal_tries']
+        steals = " steals {:.0f}/{:.0f} ({:.0%})".format(cur['steal_hits'], tries,
+                                                          cur['steal_hits'] / tries) if tries else ""
+
+        self.out.write("[telemetry{}] t={:9.2f}s files {:.0f} ({:.1f}/s), {:.3e} bytes ({:.2f} MB/s), "
+                       "dirs {:.0f}, pending {:.0f}, idle {:.0f}/{}{}\n".format(" final" if final else "",
+                                                                               now - self.tstart,
+                                                                               cur['files'], rate['files'],
+                                                                               cur['bytes'], rate['bytes'] / 1.e6,
+                                                                               cur['dirs'],
+                                                                               cur['pending'],
+                                                                               cur['idle'], self.nranks,
+                                                                               steals))
+        if self.out is sys.stdout: self.out.flush()
+
+        self.tlast = now
+        self.last[:] = self.recvbuf
+        return
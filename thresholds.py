@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+
+
+################################################################################
+class AdaptiveThresholds:
+    """ Per rank work-stealing knobs for workthief2, from what the rank
+    observes rather than fixed:
+
+      - time to scan a directory, and the round trip of a steal request
+        that brought work (each timed from its own send, per victim).
+        A thief asks for work while it still has starve_threshold =
+        latency/scan time directories left (prefetch), scaled down by the
+        steal success ratio, since asking early is wasted when most
+        requests find nothing.
+      - a victim gives away a quarter of its queue, or half while the
+        queue is growing and deep, i.e. a backlog it cannot work off
+        alone, but keeps its own prefetch depth (excess_threshold).
+      - requests per peer between termination checks follow the success
+        ratio, 1 when work is scarce up to 10.
+
+    Observations are exponentially weighted by 'alpha'; thresholds()
+    is meant to be called every few directories.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, alpha=0.2, interval=16, max_prefetch=64):
+        self.alpha        = alpha
+        self.interval     = interval
+        self.max_prefetch = max_prefetch
+        self.t_scan  = None     # seconds per directory
+        self.latency = None     # seconds from steal request to work
+        self.growth  = 0.       # queue length change per directory
+        self.ratio   = 1.       # steal hits / tries
+        self.sent    = {}       # victim : time of our request still unanswered
+        self.steps   = 0
+        self.tries   = 0
+        self.hits    = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def ewma(self, old, new):
+        return new if old is None else old + self.alpha*(new - old)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def scanned(self, dt, qlen_before, qlen_after):
+        # one progress step; true when it is time to recompute thresholds
+        if not qlen_before: return False
+        self.t_scan = self.ewma(self.t_scan, dt)
+        self.growth = self.ewma(self.growth, qlen_after - qlen_before)
+        self.steps += 1
+        return self.steps % self.interval == 0
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def request_sent(self, t, victim):
+        # an earlier request to 'victim' still pending went unanswered, a
+        # miss: only the latest counts
+        self.tries += 1
+        self.sent[victim] = t
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def work_received(self, t, victim):
+        # victims only answer when they have work, so a reply is a hit
+        self.hits += 1
+        sent = self.sent.pop(victim, None)
+        if sent is not None:
+            self.latency = self.ewma(self.latency, t - sent)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def request_missed(self, victim):
+        # known to have found nothing: not a latency sample
+        self.sent.pop(victim, None)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def thresholds(self, qlen):
+        """ (excess_threshold, starve_threshold, max_requests_per_peer,
+        split_fraction) """
+        if self.tries:
+            self.ratio = self.ewma(self.ratio, min(1., self.hits/self.tries))
+            self.tries = self.hits = 0
+
+        prefetch = 0
+        if self.t_scan and self.latency:
+            prefetch = min(self.max_prefetch, int(self.latency/self.t_scan))
+        starve = int(prefetch*self.ratio)
+        excess = max(1, starve)
+        fraction = 0.5 if (self.growth > 0. and qlen > 4*excess) else 0.25
+        max_requests = max(1, min(10, 1 + int(9*self.ratio)))
+        return (excess, starve, max_requests, fraction)
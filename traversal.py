@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+# Traversal policies for the tree walkers:
+#
+#   dfs    newest pending directory first (the default)
+#   bfs    oldest pending directory first
+#   inode  depth first, but each directory's entries are handled, and its
+#          subdirectories visited, in inode order, which follows on-disk
+#          placement on ext4/XFS and so helps metadata caching
+#   name   as inode, in name order
+#
+# Sorting is only by what a scan returns anyway: inode numbers come with
+# scandir entries, so no extra stat calls.  Scanners without them (listdir,
+# an external lister) fall back to name order.
+policies = ('dfs', 'bfs', 'inode', 'name')
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def check(policy):
+    if policy not in policies:
+        raise ValueError("unknown traversal policy '{}', expected one of {}".format(policy, ", ".join(policies)))
+    return policy
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def sort_entries(policy, entries):
+    # scandir DirEntry objects, in the order to process them
+    if policy == 'inode': return sorted(entries, key=lambda di: di.inode())
+    if policy == 'name':  return sorted(entries, key=lambda di: di.name)
+    return entries
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def sort_names(policy, names, key=None):
+    # names (or records, with 'key' giving the name), for scanners
+    # without inode numbers
+    return sorted(names, key=key) if policy in ('inode', 'name') else names
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def queue_order(policy, newdirs):
+    # sorted subdirectories go on a last-in first-out queue reversed, so
+    # they come off in order
+    return newdirs[::-1] if policy in ('inode', 'name') else newdirs
+
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def take(policy, queue):
+    # the next directory to scan from a PathQueue
+    return queue.popleft(1)[0] if policy == 'bfs' else queue.pop()
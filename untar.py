@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+
+from mpi4py import MPI
+from collections import deque
+from fnmatch import fnmatchcase
+import argparse
+import tarfile
+import glob
+import time
+import os, sys, stat
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# extract() as 'tar xf' would, on pythons that have extraction filters
+extract_kw = { 'filter' : 'fully_trusted' } if hasattr(tarfile, 'fully_trusted_filter') else {}
+
+# unit output goes to rank 0 as (unit, bytes, last) messages of up to
+# OUTPUT_CHUNK bytes on one tag, each rank keeping at most MAX_PENDING
+# sends not yet received
+OUTPUT_TAG   = 1
+OUTPUT_CHUNK = 4*1024*1024
+MAX_PENDING  = 4
+
+
+
+################################################################################
+def read_index(archive):
+    """ [(offset, size, name)] from the '<archive>.idx' sidecar, or None """
+    try:
+        with open(archive + ".idx") as f:
+            return [ (int(o), int(s), n) for o,s,n in (line.rstrip('\n').split('\t', 2) for line in f) ]
+    except OSError:
+        return None
+
+
+
+################################################################################
+def open_archive(archive):
+    """ TarFile reading 'archive', transparently decompressing .gz/.bz2/.xz,
+    and .zst through the zstandard module when python cannot """
+    if archive.endswith('.zst') and zstandard and not hasattr(tarfile.TarFile, 'zstopen'):
+        f = zstandard.ZstdDecompressor().stream_reader(open(archive, 'rb'), read_across_frames=True)
+        return tarfile.open(fileobj=f, mode='r|')
+    return tarfile.open(archive, 'r:*')
+
+
+
+################################################################################
+class Untar:
+    """ Parallel 'tar tvf', 'tar xf' and 'tar xOf'.
+
+    Rank 0 splits the archives into work units: whole archives, or for
+    uncompressed archives with a .idx sidecar, ranges of members of about
+    --split bytes each.  Units are dealt largest first to the least loaded
+    rank.  Before extracting, the directories the selected members need are
+    created collectively, one depth level at a time, so no two ranks race
+    to create the same directory.  Hard links, whose target may be in
+    another rank's unit, are made once every rank is done extracting.
+    Listings and streamed contents are forwarded to rank 0 in bounded
+    chunks and printed in archive order.
+    """
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def __init__(self, args, comm):
+        self.args     = args
+        self.comm     = comm
+        self.rank     = comm.Get_rank()
+        self.nranks   = comm.Get_size()
+        self.dirs     = []
+        self.links    = []
+        self.nmembers = 0
+        self.nbytes   = 0
+        self.errors   = 0
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def selected(self, name):
+        # tar --wildcards semantics: '*' matches '/', and a pattern naming a
+        # directory selects what is below it
+        if not self.args.include: return True
+        return any(fnmatchcase(name, p) or fnmatchcase(name, p.rstrip('/') + '/*')
+                   for p in self.args.include)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def make_units(self):
+        # (archive, start offset, end offset or None, size, index entries or None)
+        units = []
+        for archive in self.args.archives:
+            size = os.path.getsize(archive)
+            index = read_index(archive)
+            if index and self.args.split and archive.endswith('.tar') and size > self.args.split:
+                lo = 0
+                for i in range(1, len(index)+1):
+                    if i == len(index) or index[i][0] - index[lo][0] >= self.args.split:
+                        end = index[i][0] if i < len(index) else None
+                        nbytes = (end or size) - index[lo][0]
+                        units.append((archive, index[lo][0], end, nbytes, index[lo:i]))
+                        lo = i
+            else:
+                units.append((archive, 0, None, size, index))
+        return units
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def assign(self, units):
+        # largest first to the least loaded rank
+        load  = [0]*self.nranks
+        owner = [0]*len(units)
+        for u in sorted(range(len(units)), key=lambda u: -units[u][3]):
+            r = load.index(min(load))
+            owner[u] = r
+            load[r] += units[u][3]
+        return owner
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def members(self, unit):
+        # yield (tarfile, member) for the selected members of a unit
+        archive, start, end, size, index = unit
+        if start or end:
+            with open(archive, 'rb') as f:
+                f.seek(start)
+                with tarfile.open(fileobj=f, mode='r:') as tf:
+                    for ti in tf:
+                        if end is not None and ti.offset >= end: break
+                        if self.selected(ti.name): yield tf, ti
+        else:
+            with open_archive(archive) as tf:
+                for ti in tf:
+                    if self.selected(ti.name): yield tf, ti
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def make_dirs(self, units):
+        # directories the selected members of our units live in, from the .idx
+        # sidecars where there are any.  (other units' directories are
+        # created on demand by extract())
+        need = set()
+        for archive, start, end, size, index in units:
+            for offset, nbytes, name in (index or []):
+                if not self.selected(name): continue
+                name = name.rstrip('/')
+                while '/' in name:
+                    name = name.rsplit('/', 1)[0]
+                    need.add(name)
+
+        need = set().union(*self.comm.allgather(need))
+        bydepth = {}
+        for d in need: bydepth.setdefault(d.count('/'), []).append(d)
+
+        # parents exist before children; within a level, every rank makes a share
+        for depth in sorted(bydepth):
+            for d in sorted(bydepth[depth])[self.rank::self.nranks]:
+                try:
+                    os.mkdir(os.path.join(self.args.directory, d))
+                except FileExistsError:
+                    pass
+            self.comm.Barrier()
+        return len(need)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def listing(self, ti):
+        if not self.args.verbose: return ti.name + '\n'
+        mode = stat.filemode(ti.mode | { tarfile.DIRTYPE  : stat.S_IFDIR,
+                                         tarfile.SYMTYPE  : stat.S_IFLNK,
+                                         tarfile.FIFOTYPE : stat.S_IFIFO,
+                                         tarfile.CHRTYPE  : stat.S_IFCHR,
+                                         tarfile.BLKTYPE  : stat.S_IFBLK }.get(ti.type, stat.S_IFREG))
+        line = "{} {}/{} {:>10d} {} {}".format(mode, ti.uname or ti.uid, ti.gname or ti.gid, ti.size,
+                                               time.strftime("%Y-%m-%d %H:%M", time.localtime(ti.mtime)),
+                                               ti.name)
+        if ti.issym(): line += " -> " + ti.linkname
+        if ti.islnk(): line += " link to " + ti.linkname
+        return line + '\n'
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def process(self, unit):
+        # yields the bytes to print on rank 0 for this unit, in pieces
+        for tf, ti in self.members(unit):
+            self.nmembers += 1
+            self.nbytes   += ti.size
+            if self.args.mode == 'list':
+                yield self.listing(ti).encode(errors='surrogateescape')
+            elif self.args.mode == 'cat':
+                if ti.isfile():
+                    f = tf.extractfile(ti)
+                    while True:
+                        data = f.read(OUTPUT_CHUNK)
+                        if not data: break
+                        yield data
+            else:
+                if self.args.verbose: yield (ti.name + '\n').encode(errors='surrogateescape')
+                if ti.isdir():
+                    # attributes once everything below is in place, see run()
+                    tf.extract(ti, self.args.directory, set_attrs=False, **extract_kw)
+                    self.dirs.append(ti)
+                elif ti.islnk():
+                    # the target may be in another unit, see make_links()
+                    self.links.append(ti)
+                else:
+                    tf.extract(ti, self.args.directory, **extract_kw)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def chunks(self, unit):
+        # the output of process(), gathered into pieces of about OUTPUT_CHUNK
+        # bytes.  an error ends the unit early rather than the rank
+        buf = []
+        nbytes = 0
+        try:
+            for data in self.process(unit):
+                buf.append(data)
+                nbytes += len(data)
+                if nbytes >= OUTPUT_CHUNK:
+                    yield b''.join(buf)
+                    buf = []
+                    nbytes = 0
+        except Exception as err:
+            sys.stderr.write("[{}] {}: {}\n".format(self.rank, unit[0], err))
+            self.errors += 1
+        yield b''.join(buf)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def send(self, requests, msg):
+        # to rank 0, first waiting for the oldest send once MAX_PENDING are out
+        if len(requests) == MAX_PENDING: requests.popleft().wait()
+        requests.append(self.comm.issend(msg, dest=0, tag=OUTPUT_TAG))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def make_links(self):
+        # hard links, once every target has been extracted, by whichever rank
+        for ti in self.links:
+            path   = os.path.join(self.args.directory, ti.name)
+            target = os.path.join(self.args.directory, ti.linkname)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if os.path.lexists(path): os.unlink(path)
+                os.link(target, path)
+            except OSError as err:
+                sys.stderr.write("[{}] {}: {}\n".format(self.rank, path, err))
+                self.errors += 1
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def set_dir_attrs(self):
+        for ti in sorted(self.dirs, key=lambda ti: ti.name, reverse=True):
+            path = os.path.join(self.args.directory, ti.name)
+            try:
+                if os.geteuid() == 0: os.lchown(path, ti.uid, ti.gid)
+                os.chmod(path, ti.mode)
+                os.utime(path, (ti.mtime, ti.mtime))
+            except OSError as err:
+                sys.stderr.write("[{}] {}: {}\n".format(self.rank, path, err))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def run(self):
+        tstart = MPI.Wtime()
+        units = self.comm.bcast(self.make_units() if self.rank == 0 else None)
+        owner = self.assign(units)
+        mine  = [ u for u in range(len(units)) if owner[u] == self.rank ]
+
+        ndirs = 0
+        if self.args.mode == 'extract':
+            os.makedirs(self.args.directory, exist_ok=True)
+            ndirs = self.make_dirs([units[u] for u in mine])
+
+        # rank 0 prints every unit's output in order, its own included.
+        # it takes each rank's units in the order they were sent
+        stdout = sys.stdout.buffer
+        requests = deque()
+        last = None
+        for u in (range(len(units)) if self.rank == 0 else mine):
+            if self.rank == 0 and self.args.mode == 'list' and units[u][0] != last:
+                stdout.write("{} :\n".format(units[u][0]).encode())
+                last = units[u][0]
+            if owner[u] == self.rank:
+                # one message per chunk, the unit's last one flagged
+                chunks = self.chunks(units[u])
+                out = next(chunks)
+                for following in chunks:
+                    if self.rank == 0: stdout.write(out)
+                    else: self.send(requests, (u, out, False))
+                    out = following
+                if self.rank == 0: stdout.write(out)
+                else: self.send(requests, (u, out, True))
+            else:
+                done = False
+                while not done:
+                    v, out, done = self.comm.recv(source=owner[u], tag=OUTPUT_TAG)
+                    assert v == u
+                    stdout.write(out)
+        MPI.Request.waitall(list(requests))
+
+        # hard links, then directory times and permissions, once all ranks
+        # are done writing
+        self.comm.Barrier()
+        self.make_links()
+        self.comm.Barrier()
+        self.set_dir_attrs()
+
+        totals = [self.comm.reduce(v, op=MPI.SUM, root=0) for v in (self.nmembers, self.nbytes, self.errors)]
+        if self.rank == 0:
+            stdout.flush()
+            sys.stderr.write("{} members, {:.5e} bytes from {} archives ({} units, {} directories pre-created) in {:.3f} s, {} errors\n".format(
+                totals[0], totals[1], len(self.args.archives), len(units), ndirs, MPI.Wtime() - tstart, totals[2]))
+        return 1 if totals[2] else 0
+
+
+
+################################################################################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List, extract or cat tar archives in parallel under MPI.")
+    parser.add_argument("archives", nargs='*', help="archives to read (default: output-*.tar*)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("-t", "--list",    dest='mode', action='store_const', const='list', help="list members (default)")
+    mode.add_argument("-x", "--extract", dest='mode', action='store_const', const='extract', help="extract members")
+    mode.add_argument("-O", "--to-stdout", dest='mode', action='store_const', const='cat', help="write regular file contents to stdout")
+    parser.add_argument("-i", "--include",   action='append', default=[], help="only members matching this glob, may repeat (e.g. '*98K*', 'step_00007/*')")
+    parser.add_argument("-C", "--directory", default='.', help="extract into this directory (default: %(default)s)")
+    parser.add_argument("-v", "--verbose",   action='store_true', help="long listing, or print names while extracting")
+    parser.add_argument("--split",           type=int, default=1024**3, help="split indexed, uncompressed archives into units of this many bytes, 0 to never split (default: %(default)s)")
+    parser.set_defaults(mode='list')
+    args = parser.parse_args()
+
+    comm = MPI.COMM_WORLD
+    if not args.archives:
+        args.archives = comm.bcast(sorted(f for f in glob.glob("output-*.tar*")
+                                          if not f.endswith(('.idx', '.chunks'))) if comm.Get_rank() == 0 else None)
+    sys.exit(Untar(args, comm).run())
@@ -0,0 +1 @@
+../batchqueue.py
\ No newline at end of file
@@ -0,0 +1 @@
+../compressor.py
\ No newline at end of file
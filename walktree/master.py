@@ -2,6 +2,11 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
+from pathcodec import PathLink, unpack
+from pathqueue import PathQueue
+from traversal import check, take
+from slave import stream_names
+import resume
 import os
 import time
 
@@ -14,17 +19,40 @@ class Master(MPIClass):
     def __init__(self,dirs=None,options=None):
         MPIClass.__init__(self,options)
         self.iteration=0
-        self.dirs = dirs
+        # pending directories in an arena (see pathqueue.py), optionally
+        # spilling to disk beyond 'dirqueue_max_bytes'
+        self.dirs = PathQueue(dirs or [],
+                              max_bytes=self.get_option('dirqueue_max_bytes', 0),
+                              spill_dir=self.get_option('dirqueue_spill_dir'))
         self.num_files = 0
         self.num_dirs = 0
         self.file_size = 0
         self.niter = 10*self.comm.Get_size()
         self.any_dirs = [False for p in range(0,self.nranks)]
         self.any_dirs[0] = True
+        # 'traversal' policy: dfs, bfs, inode or name (see traversal.py)
+        self.traversal = check(self.get_option('traversal', 'dfs'))
+        # directories go out front coded against the last one sent to each slave
+        self.links = [PathLink() for p in range(0,self.nranks)]
+        # on restart, directories an earlier run completed go out to be
+        # scanned for subdirectories only (see resume.py)
+        self.completed = set()
+        if self.get_option('restart', False):
+            nwriters = max(1, self.get_option('writers', 1))
+            streams = [ name for r in range(1, self.nranks) for name in stream_names(r, nwriters) ]
+            self.completed = resume.completed_dirs(streams=streams)
         return
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def telemetry_sample(self):
+        # slaves with no directory assigned are idle
+        return (self.num_files, self.file_size, self.num_dirs, len(self.dirs),
+                self.any_dirs[1:].count(False), 0, 0)
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def finished(self):
         self.iteration +=1
@@ -47,6 +75,9 @@ class Master(MPIClass):
 
             self.any_dirs[0] = True if self.dirs else False
 
+            if self.telemetry: self.telemetry.poll()
+            self.poll_log()
+
             #print(self.any_dirs)
 
             # check for incoming directories
@@ -54,7 +85,7 @@ class Master(MPIClass):
                 ready_rank = status.Get_source()
                 self.any_dirs[0]          = True
                 self.any_dirs[ready_rank] = False
-                more_dirs  = self.comm.recv(source=ready_rank, tag=self.tags['dir_reply'])
+                more_dirs  = unpack(self.comm.recv(source=ready_rank, tag=self.tags['dir_reply']))
                 assert more_dirs
                 self.dirs.extend(more_dirs)
                 #print(" *** master received a dir_reply from [{:3d}] {} ***".format(ready_rank, more_dirs))
@@ -67,11 +98,14 @@ class Master(MPIClass):
                 self.any_dirs[ready_rank] = False
                 self.comm.recv(source=ready_rank, tag=self.tags['ready'])
                 next_dir = None
+                tag = self.tags['execute']
                 if self.dirs:
-                    next_dir  = self.dirs.pop()
+                    dirname   = take(self.traversal, self.dirs)
+                    next_dir  = self.links[ready_rank].encode(dirname)
                     self.any_dirs[ready_rank] = True
+                    if dirname in self.completed: tag = self.tags['rescan']
                     #print("Running dir {} on rank {}".format(next_dir, ready_rank))
-                self.comm.send(next_dir, dest=ready_rank, tag=self.tags['execute'])
+                self.comm.send(next_dir, dest=ready_rank, tag=tag)
 
 
 
@@ -89,4 +123,7 @@ class Master(MPIClass):
         # OK, messages sent, wait for all to complete
         MPI.Request.waitall(requests)
 
+        if self.telemetry: self.telemetry.finalize()
+        self.dirs.close()
+
         return
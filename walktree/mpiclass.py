@@ -6,6 +6,7 @@ import sys
 import tempfile
 import shutil
 import platform
+import threading
 from collections import defaultdict
 
 
@@ -15,6 +16,7 @@ class MPIClass:
 
     tags ={ 'ready'         : 10,
             'execute'       : 11,
+            'rescan'        : 12,
             'work_reply'    : 20,
             'work_request'  : 21,
             'work_deny'     : 22,
@@ -22,6 +24,11 @@ class MPIClass:
             'dir_reply'     : 31,
             'terminate'     : 1000 }
 
+    # log levels, see log()
+    LOG_ERROR = 0
+    LOG_INFO  = 1
+    LOG_DEBUG = 2
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __init__(self,options=None):
         # initialization, get 'options' data structure from rank 0
@@ -29,7 +36,8 @@ class MPIClass:
         self.rank   = self.comm.Get_rank()
         self.nranks = self.comm.Get_size()
         self.i_am_root = False if self.rank else True
-        self.options = self.comm.bcast(options)
+        self.options = self.comm.bcast(self.env_options(options) if self.i_am_root else None)
+        self.rundir = os.getcwd()
 
         self.dirs = None
         self.num_files = 0
@@ -37,14 +45,194 @@ class MPIClass:
         self.file_size = 0
         self.st_modes = defaultdict(int)
 
+        self.init_logging()
+        self.telemetry = None
+        self.init_telemetry()
+
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def env_options(self, options=None):
+        # (root only) merge any TASK_RUNNER_<KEY>=<value> environment settings
+        # into the 'options' structure, which is then broadcast to all ranks.
+        # a set of flags like {'archive'} becomes {'archive' : True}
+        opts = {}
+        if options:
+            if isinstance(options, dict): opts.update(options)
+            else: opts.update({ k : True for k in options })
+        prefix = 'TASK_RUNNER_'
+        for k,v in os.environ.items():
+            if k.startswith(prefix):
+                opts[k[len(prefix):].lower()] = v
+        return opts
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def get_option(self, key, default=None):
+        # look up an option, converting string values (from the environment)
+        # to the type of 'default'
+        val = self.options.get(key, default)
+        if isinstance(val, str) and default is not None and not isinstance(default, str):
+            if isinstance(default, bool):
+                return val.lower() not in ('', '0', 'no', 'off', 'false')
+            return type(default)(val)
+        return val
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_telemetry(self):
+        # optional periodic progress line from rank 0, every 'telemetry' seconds
+        interval = self.get_option('telemetry', 0.)
+        if interval > 0.:
+            from telemetry import Telemetry
+            self.telemetry = Telemetry(self.comm, self.telemetry_sample, interval,
+                                       self.get_option('telemetry_file'))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def telemetry_sample(self):
+        # ordered as Telemetry.fields; the master overrides with its view of
+        # pending directories and idle ranks
+        return (self.num_files, self.file_size, self.num_dirs, 0, 0, 0, 0)
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_logging(self):
+        # buffered, per-rank logging.  messages above 'log_level' are dropped
+        # before formatting; the rest are appended to an in-memory buffer
+        # and written out when it exceeds 'log_bufsize' bytes, or by
+        # gather_log() (collectively).  'log_mode' selects
+        #   - 'gather' (default): through rank 0.  a full buffer is sent to
+        #     rank 0 on a private duplicate communicator, and printed there
+        #     by poll_log(), which work loops call.  errors are printed at
+        #     once instead of buffered
+        #   - 'file': per-rank files, log-<rank>.txt, only
+        #   - 'stdout': unbuffered print, the old behavior
+        self.log_level   = self.get_option('log_level', self.LOG_DEBUG if self.get_option('verbose', False) else self.LOG_INFO)
+        self.log_mode    = self.get_option('log_mode', 'gather')
+        self.log_bufsize = self.get_option('log_bufsize', 64*1024*1024)
+        self.log_buffer  = []
+        self.log_bytes   = 0
+        self.log_file    = None
+        self.log_lock    = threading.Lock()
+        self.log_comm    = self.comm.Dup() if self.log_mode == 'gather' else None
+        self.log_sends   = []
+        self.log_nsent   = 0                    # buffers sent to rank 0
+        self.log_nrecv   = [0]*self.nranks      # (rank 0) from each rank
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def log(self, level, fmt, *args):
+        if level > self.log_level: return
+        msg = fmt.format(*args) if args else fmt
+        if self.log_mode == 'stdout' or (level == self.LOG_ERROR and self.log_mode == 'gather'):
+            print(msg, flush=True)
+            return
+        with self.log_lock:
+            self.log_buffer.append(msg)
+            self.log_bytes += len(msg) + 1
+            full = self.log_bytes > self.log_bufsize
+            if full and not self.log_comm: self.flush_log()
+        if full and self.log_comm: self.poll_log()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def take_log(self):
+        # detach and return the current buffer contents as one string
+        text = ''
+        if self.log_buffer:
+            self.log_buffer.append('')
+            text = '\n'.join(self.log_buffer)
+        self.log_buffer = []
+        self.log_bytes  = 0
+        return text
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def flush_log(self):
+        # (local) write any buffered messages to our per-rank log file in a
+        # single write.  called with log_lock held
+        text = self.take_log()
+        if text:
+            if not self.log_file:
+                self.log_file = open(os.path.join(self.rundir, "log-{:05d}.txt".format(self.rank)), "a")
+            self.log_file.write(text)
+            self.log_file.flush()
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def poll_log(self):
+        # (gather mode, main thread) rank 0 prints the buffers other ranks
+        # have sent; the others send theirs once full.  sends are never
+        # waited for here, as rank 0 may be busy waiting on us
+        if not self.log_comm or threading.current_thread() is not threading.main_thread(): return
+        status = MPI.Status()
+        if self.i_am_root:
+            while self.log_comm.iprobe(source=MPI.ANY_SOURCE, tag=0, status=status):
+                sys.stdout.write(self.log_comm.recv(source=status.Get_source(), tag=0))
+                self.log_nrecv[status.Get_source()] += 1
+            with self.log_lock:
+                text = self.take_log() if self.log_bytes > self.log_bufsize else ''
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        if self.log_bytes <= self.log_bufsize and not self.log_sends: return
+        self.log_sends = [ r for r in self.log_sends if not r.test()[0] ]
+        with self.log_lock:
+            text = self.take_log() if self.log_bytes > self.log_bufsize else ''
+        if text:
+            self.log_sends.append(self.log_comm.isend(text, dest=0, tag=0))
+            self.log_nsent += 1
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def gather_log(self):
+        # (collective) in 'gather' mode, print every rank's buffer through
+        # rank 0, in rank order, one rank's at a time.  otherwise just flush
+        # locally
+        if self.log_mode != 'gather':
+            with self.log_lock: self.flush_log()
+            return
+        with self.log_lock: text = self.take_log()
+        if not self.i_am_root:
+            # the rest, with how many buffers went before it
+            self.log_comm.send((text, self.log_nsent), dest=0, tag=1)
+            MPI.Request.waitall(self.log_sends)
+            self.log_sends = []
+            return
+        self.poll_log()
+        sys.stdout.write(text)
+        for rank in range(1, self.nranks):
+            text, nsent = self.log_comm.recv(source=rank, tag=1)
+            while self.log_nrecv[rank] < nsent:
+                sys.stdout.write(self.log_comm.recv(source=rank, tag=0))
+                self.log_nrecv[rank] += 1
+            sys.stdout.write(text)
+        sys.stdout.flush()
         return
 
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __del__(self):
-        self.cleanup()
         self.summary()
+        self.cleanup()
         return
 
 
@@ -79,6 +267,15 @@ class MPIClass:
         #     os.chdir(self.rundir)
         #     shutil.rmtree(self.local_rankdir,ignore_errors=True)
         #     self.local_rankdir = None
+
+        # anything not yet gathered goes to our per-rank log file, or in
+        # 'gather' mode (no longer collective here) straight to stdout
+        with self.log_lock:
+            if self.log_comm: sys.stdout.write(self.take_log())
+            else: self.flush_log()
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
         return
 
 
@@ -86,6 +283,9 @@ class MPIClass:
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def summary(self):
 
+        # collect buffered log messages before the summary
+        self.gather_log()
+
         self.comm.Barrier()
         stat_keys = set(self.st_modes.keys())
 
@@ -0,0 +1 @@
+../pathcodec.py
\ No newline at end of file
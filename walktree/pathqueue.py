@@ -0,0 +1 @@
+../pathqueue.py
\ No newline at end of file
@@ -0,0 +1 @@
+../resume.py
\ No newline at end of file
@@ -2,11 +2,24 @@
 
 from mpi4py import MPI
 from mpiclass import MPIClass
-import tarfile
+from tarwriter import member_size, BLOCKSIZE
+from batchqueue import BatchQueue
+from pathcodec import PathLink, pack
+from traversal import check, sort_entries, queue_order
+import resume
 import os, sys, stat
 import shutil
 import threading
-import queue
+
+
+################################################################################
+def stream_names(rank, nwriters):
+    # the archive streams of slave 'rank', output-<rank>.tar for a single
+    # writer or output-<rank>-w<i>.tar for several
+    if nwriters == 1:
+        return [ "output-{:05d}".format(rank) ]
+    return [ "output-{:05d}-w{:02d}".format(rank, i) for i in range(nwriters) ]
+
 
 
 ################################################################################
@@ -16,25 +29,47 @@ class Slave(MPIClass):
     def __init__(self):
         MPIClass.__init__(self)
 
-        self.tar = None;
         # on first call, have master print our local config. we can do this by sending
         # a note as our first 'result'
         self.result = None #" Rank {} using local directory {}".format(self.rank, self.local_rankdir)
+        self.link = PathLink()
+        self.traversal = check(self.get_option('traversal', 'dfs'))
 
         # # process options. open any files thay belong in shared run directory.
         # if "archive" in self.options:
-        self.tar = tarfile.open("output-{:05d}.tar".format(self.rank), "w")
-        self.queue = queue.Queue(maxsize=5000)
-
-        self.t = threading.Thread(target=self.process_queue, daemon=True)
-        self.t.start()
+        # 'writers' tar threads, each with its own archive, output-<rank>.tar
+        # for a single writer or output-<rank>-w<i>.tar for several.  file
+        # reads and writes release the GIL, so they overlap
+        # each archive has its journal of completed directories, with
+        # 'dir_journal' or on 'restart' (see resume.py)
+        nwriters = max(1, self.get_option('writers', 1))
+        streams = [ resume.open_archive(name, self.get_option) for name in stream_names(self.rank, nwriters) ]
+        self.tars     = [ tar for tar, journal in streams ]
+        self.journals = [ journal for tar, journal in streams ]
+
+        # (path, statinfo) items are handed to the tar threads in batches of
+        # up to 'batch_items' entries or 'batch_bytes' archive bytes, and at
+        # most 'queue_bytes' of archive data may be waiting at any time
+        self.queue       = BatchQueue(self.get_option('queue_bytes', 256*1024*1024))
+        self.batch       = []
+        self.batch_bytes = 0
+        self.batch_items_max = self.get_option('batch_items', 1024)
+        self.batch_bytes_max = self.get_option('batch_bytes', 4*1024*1024)
+        # journaled directories go to a tar thread whole, so their members
+        # are in the one archive, directory last
+        self.journaling = resume.enabled(self.get_option)
+
+        self.threads = [ threading.Thread(target=self.process_queue, args=stream, daemon=True)
+                         for stream in streams ]
+        for t in self.threads: t.start()
 
         return
 
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def process_directory(self, dirname):
+    def process_directory(self, dirname, rescan=False):
+        # 'rescan': completed before a restart, only look for subdirectories
         self.num_dirs += 1
 
         #print("[{:3d}](d) {}".format(self.rank, dirname))
@@ -44,7 +79,7 @@ class Slave(MPIClass):
         # python scandir implementation follows
         self.dirs = []
         try:
-            for di in os.scandir(dirname):
+            for di in sort_entries(self.traversal, os.scandir(dirname)):
                 f        = di.name
                 pathname = di.path
 
@@ -52,18 +87,33 @@ class Slave(MPIClass):
 
                 if di.is_dir(follow_symlinks=False):
                     self.dirs.append(pathname)
-                else:
+                elif not rescan:
                     self.process_file(pathname, statinfo)
         except:
-            print("cannot scan {}".format(dirname))
+            self.log(self.LOG_ERROR, "cannot scan {}", dirname)
+
+        if rescan: return
 
         # add the directory object itself, to get any special permissions or ACLs
-        self.queue.put(dirname)
+        self.batch.append((dirname, None))
+        self.batch_bytes += BLOCKSIZE
+        if len(self.batch) >= self.batch_items_max or self.batch_bytes >= self.batch_bytes_max:
+            self.flush_batch()
 
         return
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def flush_batch(self):
+        if self.batch:
+            self.queue.put(self.batch, self.batch_bytes)
+            self.batch = []
+            self.batch_bytes = 0
+        return
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def process_file(self, filename, statinfo):
         #print("[{:3d}](f) {}".format(self.rank, filename))
@@ -82,25 +132,37 @@ class Slave(MPIClass):
         elif stat.S_ISSOCK(fmode): ftype = 's'; self.st_modes['sock']  += 1
         elif stat.S_ISDIR(fmode):  assert False # huh??
 
-        self.queue.put(filename)
+        self.batch.append((filename, statinfo))
+        self.batch_bytes += member_size(statinfo)
+        if self.journaling: return
+        if len(self.batch) >= self.batch_items_max or self.batch_bytes >= self.batch_bytes_max:
+            self.flush_batch()
         return
 
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def process_queue(self):
+    def process_queue(self, tar, journal=None):
 
+        debug = (self.log_level >= self.LOG_DEBUG)
         while True:
-            item = self.queue.get()
-            if item:
-                print("[{:3d}] {}".format(self.rank, item))
-                if self.tar: self.tar.add(item, recursive=False)
-            self.queue.task_done()
-
-            if item is None:
-                print("[{:3d}] *** terminating thread ***".format(self.rank))
-                assert self.queue.empty()
+            batch = self.queue.get()
+
+            if batch is None:
+                self.log(self.LOG_DEBUG, "[{:3d}] *** terminating thread ***", self.rank)
                 break
+
+            if debug:
+                for path, statinfo in batch:
+                    self.log(self.LOG_DEBUG, "[{:3d}] {}", self.rank, path)
+            add = tar.add
+            if journal:
+                # a directory itself (no statinfo) comes after its contents
+                for path, statinfo in batch:
+                    add(path, statinfo)
+                    if statinfo is None: journal.completed(path, tar)
+            else:
+                for path, statinfo in batch: add(path, statinfo)
         return
 
 
@@ -131,7 +193,7 @@ class Slave(MPIClass):
 
 
             if self.dirs:
-                self.comm.ssend(self.dirs, dest=0, tag=self.tags['dir_reply'])
+                self.comm.ssend(pack(queue_order(self.traversal, self.dirs)), dest=0, tag=self.tags['dir_reply'])
                 self.dirs = None
 
 
@@ -151,7 +213,11 @@ class Slave(MPIClass):
                 assert next_dir
 
                 tstart = MPI.Wtime()
-                self.process_directory(next_dir)
+                self.process_directory(self.link.decode(next_dir),
+                                       rescan=(status.Get_tag() == self.tags['rescan']))
+
+            if self.telemetry: self.telemetry.poll()
+            self.poll_log()
 
                 #self.run_serial_task()
                 #print("[{:3d}] {}".format(self.rank, next_dir))
@@ -159,7 +225,13 @@ class Slave(MPIClass):
                 #                                                          next_dir,
                 #                                                          round(MPI.Wtime() - tstart,5))
 
-        # Done with MPI bits, tell our thread
-        self.queue.put(None)
-        self.t.join()
+        if self.telemetry: self.telemetry.finalize()
+
+        # Done with MPI bits, tell our threads
+        self.flush_batch()
+        for t in self.threads: self.queue.put(None)
+        for t in self.threads: t.join()
+        for journal in self.journals:
+            if journal: journal.close()
+        for tar in self.tars: tar.close()
         return
@@ -0,0 +1 @@
+../tarwriter.py
\ No newline at end of file
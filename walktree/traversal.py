@@ -0,0 +1 @@
+../traversal.py
\ No newline at end of file
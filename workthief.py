@@ -1,22 +1,19 @@
 #!/usr/bin/env python
-import shutil
-import numpy as np
-import tarfile
-import os, sys, copy
+import os, sys
+from array import array
 from random import randint, seed
 from stat import *
-from write_rand_data import *
 from collections import defaultdict
-from time import sleep
 from mpi4py import MPI
+import bundle
+bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
 from mpiclass import MPIClass
+from pathcodec import pack, unpack
+from pathqueue import PathQueue
 
 
 
 
-np.set_printoptions(threshold=7)
-
-
 ################################################################################
 class WorkThief(MPIClass):
 
@@ -30,9 +27,12 @@ class WorkThief(MPIClass):
         self.last_steal = self.rank_up
 
         self.instruct = None;
-        self.queue = []
-        self.dirs = []
-        self.files = []
+        # pending directories in an arena (see pathqueue.py), found
+        # directories & files only counted
+        self.queue = PathQueue(max_bytes=self.get_option('dirqueue_max_bytes', 0),
+                               spill_dir=self.get_option('dirqueue_spill_dir'))
+        self.num_dirs = 0
+        self.num_files = 0
         self.excess_threshold =  2
         self.starve_threshold =  0
         self.sendvals = defaultdict(list)
@@ -61,8 +61,9 @@ class WorkThief(MPIClass):
 
         sep="-"*80
         assert len(self.queue) == 0
-        nfiles = len(self.files)
-        ndirs  = len(self.dirs)
+        nfiles = self.num_files
+        ndirs  = self.num_dirs
+        self.queue.close()
 
         # print end message
         for p in range(0,self.nranks):
@@ -88,7 +89,7 @@ class WorkThief(MPIClass):
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def recurse(self, top, maxdepth=10**9, depth=0):
 
-        self.dirs.append(top)
+        self.num_dirs += 1
 
         for f in os.listdir(top):
             pathname = os.path.join(top, f)
@@ -100,7 +101,7 @@ class WorkThief(MPIClass):
                     self.queue.append(pathname)
             else:
                 #print(statinfo)
-                self.files.append(pathname)
+                self.num_files += 1
         return
 
 
@@ -112,8 +113,7 @@ class WorkThief(MPIClass):
             self.recurse(rootdir, maxdepth=0)
             sep="-s"*40
             print("{}\ndir queue, {} items=\n{}".format(sep, len(self.queue), self.queue))
-            print("{}\ndirs found {} items=\n{}".format(sep, len(self.dirs),  self.dirs))
-            print("{}\nfiles found {} items=\n{}".format(sep,len(self.files), self.files))
+            print("{}\nfound {} dirs, {} files".format(sep, self.num_dirs, self.num_files))
 
             # populate initial tasks for other ranks
             excess = self.excess_work()
@@ -126,7 +126,7 @@ class WorkThief(MPIClass):
             for dest in range(1,self.nranks):
                 if self.sendvals[dest]:
                     print("sending {} entries '{}' to rank {}".format(len(self.sendvals[dest]),self.sendvals[dest],dest))
-                    self.requests[dest] = self.comm.issend(self.sendvals[dest], dest=dest, tag=self.tags['work_reply'])
+                    self.requests[dest] = self.comm.issend(pack(self.sendvals[dest]), dest=dest, tag=self.tags['work_reply'])
 
 
             print("{}\ndir queue, {} items=\n{}".format(sep, len(self.queue), self.queue))
@@ -161,15 +161,13 @@ class WorkThief(MPIClass):
 
         if mid == 0: return None
 
-        front = self.queue[0:mid]
-        back  = self.queue[mid:]
+        front = self.queue.popleft(mid)
 
-        if (len(front) + len(back)) != curlen:
-            print ("q={},\nf={},\nb={}".format(self.queue, front, back))
-            print (len(front),len(back),(len(front)+len(back)),curlen)
+        if (len(front) + len(self.queue)) != curlen:
+            print ("q={},\nf={}".format(self.queue, front))
+            print (len(front),len(self.queue),(len(front)+len(self.queue)),curlen)
             raise Exception('error splitting queue!')
 
-        self.queue = back
         return front
 
 
@@ -206,10 +204,7 @@ class WorkThief(MPIClass):
             seed(self.rank)
             WorkThief.rand_initialized = True
 
-        vals=np.empty(nentries, dtype=np.int)
-
-        for idx in range(0,nentries):
-            vals[idx] = randint(0,10**9) % self.nranks
+        vals = array('l', [ randint(0,10**9) % self.nranks for idx in range(0,nentries) ])
 
         return vals
 
@@ -221,8 +216,8 @@ class WorkThief(MPIClass):
         srcs=set()
 
         # intialiaze acounting & misc vals
-        my_size     = np.full(1, 1, dtype=np.int)
-        gloabl_size = np.full(1, 1, dtype=np.int)
+        my_size     = array('l', [1])
+        gloabl_size = array('l', [1])
 
         recv_cnt = 0
         recv_loop = 0
@@ -279,7 +274,7 @@ class WorkThief(MPIClass):
                     srcs.add(source)
 
                     # complete the receive
-                    recvval = self.comm.recv(source=source, tag=self.tags['work_reply'])
+                    recvval = unpack(self.comm.recv(source=source, tag=self.tags['work_reply']))
                     recv_cnt += 1
                     if recvval:
                         #print("{:3d} rank got '{}' from rank {:3d}".format(self.rank,recvval,source))
@@ -307,7 +302,7 @@ class WorkThief(MPIClass):
                     if self.excess_work():
                         self.sendvals[source] = self.split_queue()
                         print("rank {:3d} satisfying work request from {}".format(self.rank, source))
-                        self.requests[source] = self.comm.issend(self.sendvals[source],
+                        self.requests[source] = self.comm.issend(pack(self.sendvals[source]),
                                                                  dest=source,
                                                                  tag=self.tags['work_reply'])
                     else:
@@ -388,7 +383,7 @@ class WorkThief(MPIClass):
                                                                                                                recv_cnt,
                                                                                                                len(srcs),
                                                                                                                recv_loop,
-                                                                                                               np.array(list(srcs))))
+                                                                                                               sorted(srcs)))
 
         return
 
@@ -1,22 +1,27 @@
 #!/usr/bin/env python
-import shutil
-import numpy as np
-import tarfile
-import subprocess
-import os, sys, copy
-from random import randint, seed
+import os, sys
+from array import array
 from stat import *
-from write_rand_data import *
 from collections import defaultdict
-from time import sleep
 from mpi4py import MPI
+import bundle
+bundle.from_env(MPI.COMM_WORLD) # TASK_RUNNER_BUNDLE: import the rest from memory
 from mpiclass import MPIClass
+from pathcodec import pack, unpack
+from pathqueue import PathQueue
+from traversal import check, sort_entries, sort_names, queue_order, take
 
-np.set_printoptions(threshold=7)
+# heavier modules (numpy for telemetry and profiling, subprocess for
+# the external lister) are imported where they are used, so that thousands of
+# ranks starting up do not all load them from the shared file system
 
 ################################################################################
 class WorkThief(MPIClass):
 
+    # subclasses that need file metadata (e.g. to archive) set this, so the
+    # scandir result is stat'ed once and passed along to process_file()
+    want_stat = False
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def __init__(self):
 
@@ -26,7 +31,10 @@ class WorkThief(MPIClass):
         # self.rank_down = (self.nranks-1) if self.i_am_root else (self.rank-1)
         self.last_steal = -1
 
-        self.queue = []
+        # pending directories in an arena (see pathqueue.py), optionally
+        # spilling to disk beyond 'dirqueue_max_bytes'
+        self.queue = PathQueue(max_bytes=self.get_option('dirqueue_max_bytes', 0),
+                               spill_dir=self.get_option('dirqueue_spill_dir'))
         self.dirs = []
         self.files = []
         self.num_files = 0
@@ -35,6 +43,33 @@ class WorkThief(MPIClass):
         self.st_modes = defaultdict(int)
         self.excess_threshold =  1
         self.starve_threshold =  0
+        self.max_requests_per_peer = 10
+        self.split_fraction = 0.25
+        self.steal_tries = 0
+        self.steal_hits  = 0
+        self.telemetry = None
+        self.profile = None
+
+        # directory scanner backend, 'scanner' is one of 'scandir',
+        # 'listdir' or 'lister' (a long-lived helper process, see lister.py)
+        self.scanner = { 'scandir' : self.scandir_recurse,
+                         'listdir' : self.listdir_recurse,
+                         'lister'  : self.lister_recurse }[self.get_option('scanner', 'scandir')]
+        self.lister = None
+        self.lister_batch = self.get_option('lister_batch', 256)
+
+        # 'traversal' policy: dfs, bfs, inode or name (see traversal.py)
+        self.traversal = check(self.get_option('traversal', 'dfs'))
+
+        # optionally tune the thresholds above as we go (see thresholds.py)
+        self.adaptive = None
+        if self.get_option('adaptive', False):
+            from thresholds import AdaptiveThresholds
+            self.adaptive = AdaptiveThresholds()
+
+        # directories an interrupted earlier run already handled: scanned
+        # for subdirectories, but their files are skipped
+        self.completed = self.completed_dirs()
 
         self.sendvals = [list() for p in range(0,self.nranks) ] #defaultdict(list)
         self.assign_requests = [MPI.REQUEST_NULL for p in range(0,self.nranks) ]
@@ -54,9 +89,44 @@ class WorkThief(MPIClass):
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_telemetry(self):
+        # optional periodic progress line from rank 0, every 'telemetry' seconds
+        interval = self.get_option('telemetry', 0.)
+        if interval > 0.:
+            from telemetry import Telemetry
+            self.telemetry = Telemetry(self.comm, self.telemetry_sample, interval,
+                                       self.get_option('telemetry_file'))
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def init_profile(self):
+        # optional per-phase timers, 'profile' is one of
+        # 'timers', 'cprofile' or 'yappi' (the latter two imply timers)
+        mode = self.get_option('profile', '')
+        if mode:
+            from profiling import PhaseProfile
+            self.profile = PhaseProfile(self.rank, mode)
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def telemetry_sample(self):
+        # ordered as Telemetry.fields
+        return (self.num_files, self.file_size, self.num_dirs, len(self.queue),
+                0 if self.queue else 1, self.steal_tries, self.steal_hits)
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def summary(self):
 
+        # collect buffered log messages before the summary
+        self.gather_log()
+
         self.comm.Barrier()
         sys.stdout.flush()
 
@@ -84,6 +154,13 @@ class WorkThief(MPIClass):
         if self.i_am_root:
             print("{}\nTotal found {} files, {} dirs".format(sep,nfiles_tot,ndirs_tot))
             print("Total File Size = {:.5e} bytes".format(fsize_tot))
+
+        if self.profile:
+            self.profile.report(self.comm, { 'adaptive'              : bool(self.adaptive),
+                                             'excess_threshold'      : self.excess_threshold,
+                                             'starve_threshold'      : self.starve_threshold,
+                                             'max_requests_per_peer' : self.max_requests_per_peer,
+                                             'split_fraction'        : self.split_fraction })
         return
 
 
@@ -106,9 +183,23 @@ class WorkThief(MPIClass):
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def directory_done(self, dirname):
+        # called once all of a directory's files have been processed
+        return
+
+
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def completed_dirs(self):
+        # (collective) subclasses that can resume return what is done
+        return frozenset()
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def recurse(self, top, maxdepth=10**9, depth=0):
-        self.scandir_recurse(top,maxdepth,depth)
+        self.scanner(top,maxdepth,depth)
         return
 
 
@@ -117,15 +208,16 @@ class WorkThief(MPIClass):
     def scandir_recurse(self, top, maxdepth=10**9, depth=0):
 
         self.process_directory(top)
+        skip = top in self.completed
 
         #-------------------------------------
         # python scandir implementation follows
         newdirs = []
         try:
-            for di in os.scandir(top):
+            for di in sort_entries(self.traversal, os.scandir(top)):
                 f        = di.name
                 pathname = di.path
-                statinfo = None #di.stat(follow_symlinks=False)
+                statinfo = di.stat(follow_symlinks=False) if self.want_stat else None
                 if statinfo:
                     self.st_modes[statinfo.st_mode] += 1
                 #try:
@@ -134,11 +226,12 @@ class WorkThief(MPIClass):
                         self.recurse(pathname, maxdepth, depth=depth+1)
                     else:
                         newdirs.append(pathname)
-                else:
+                elif not skip:
                     self.process_file(pathname, statinfo)
-            self.queue.extend(newdirs)
+            self.queue.extend(queue_order(self.traversal, newdirs))
+            if not skip: self.directory_done(top)
         except:
-            print("cannot scan {}".format(top))
+            self.log(self.LOG_ERROR, "cannot scan {}", top)
 
         return
         # end python scandir implementation
@@ -151,14 +244,15 @@ class WorkThief(MPIClass):
     def listdir_recurse(self, top, maxdepth=10**9, depth=0):
 
         self.process_directory(top)
+        skip = top in self.completed
 
         #-------------------------------------
         # python listdir implementation follows
         contents = []
         try:
-            contents = os.listdir(top)
+            contents = sort_names(self.traversal, os.listdir(top))
         except:
-            print("cannot list {}".format(top))
+            self.log(self.LOG_ERROR, "cannot list {}", top)
             return
 
         newdirs = []
@@ -173,13 +267,14 @@ class WorkThief(MPIClass):
                         self.recurse(pathname, maxdepth, depth=depth+1)
                     else:
                         newdirs.append(pathname)
-                else:
+                elif not skip:
                     self.process_file(pathname, statinfo)
             except:
-                print("cannot stat {}".format(pathname))
+                self.log(self.LOG_ERROR, "cannot stat {}", pathname)
                 continue
 
-        self.queue.extend(newdirs)
+        self.queue.extend(queue_order(self.traversal, newdirs))
+        if not skip: self.directory_done(top)
         # end python listdir implementation
         #----------------------------------
         return
@@ -187,62 +282,46 @@ class WorkThief(MPIClass):
 
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    def lfs_recurse(self, top, maxdepth=10**9, depth=0):
-
-        self.dirs.append(top)
-
-        print(top)
-        #--------------------------------
-        # lfs find implementation follows
-        find_dirs   = "cd {} && lfs find . --maxdepth 1 -type d".format(top)
-        find_others = "cd {} && lfs find . --maxdepth 1 ! -type d".format(top)
-
-        # process directories
-        #print(find_dirs)
-        process = subprocess.Popen(find_dirs,
-                                   shell=True,
-                                   stdout=subprocess.PIPE)
-        while True:
-            output = process.stdout.readline()
-            output = output.decode('ascii')
-            if output == '' and process.poll() is not None: break
-            if output:
-                output=output.rstrip('\n')
-                if output is '.': continue
-                output=output.lstrip('./')
-                #print("output={}".format(output))
-                pathname = os.path.join(top, output)
-                #print("pathname={}".format(pathname))
-                if (depth < maxdepth):
-                    self.recurse(pathname, maxdepth, depth=depth+1)
-                else:
-                    self.queue.append(pathname)
-
-        rc = process.poll()
-
-        # process non-directories
-        #print(find_others)
-        process = subprocess.Popen(find_others,
-                                   shell=True,
-                                   stdout=subprocess.PIPE)
-        while True:
-            output = process.stdout.readline()
-            output = output.decode('ascii')
-            if output == '' and process.poll() is not None: break
-            if output:
-                output=output.rstrip('\n')
-                output=output.lstrip('./')
-                #print("output={}".format(output))
-                pathname = os.path.join(top, output)
-                #print("pathname={}".format(pathname))
-                #self.files.append(pathname)
-                self.num_files += 1
-
-        rc = process.poll()
-
-        #print(self.files)
-        #print(self.queue)
-        #----------------------------------
+    def lister_recurse(self, top, maxdepth=10**9, depth=0):
+
+        # external lister implementation: a level at a time, each level sent
+        # to our helper process in batches of up to 'lister_batch' directories
+        if not self.lister:
+            from lister import ExternalLister
+            self.lister = ExternalLister(self.get_option('lister_cmd'))
+
+        level = [top]
+        while level:
+            newdirs = []
+            for i in range(0, len(level), self.lister_batch):
+                batch = level[i:i+self.lister_batch]
+                for dirname, (entries, error) in zip(batch, self.lister.scan(batch)):
+                    self.process_directory(dirname)
+                    skip = dirname in self.completed
+                    if error:
+                        self.log(self.LOG_ERROR, "cannot scan {}: {}", dirname, error)
+                    for ftype, name in sort_names(self.traversal, entries, key=lambda e: e[1]):
+                        pathname = os.path.join(dirname, os.fsdecode(name))
+                        if ftype == b'd':
+                            newdirs.append(pathname)
+                            continue
+                        if skip: continue
+                        statinfo = None
+                        if self.want_stat:
+                            try:
+                                statinfo = os.lstat(pathname)
+                                self.st_modes[statinfo.st_mode] += 1
+                            except OSError:
+                                self.log(self.LOG_ERROR, "cannot stat {}", pathname)
+                                continue
+                        self.process_file(pathname, statinfo)
+                    if not (skip or error): self.directory_done(dirname)
+            if depth < maxdepth:
+                level = newdirs
+                depth += 1
+            else:
+                self.queue.extend(queue_order(self.traversal, newdirs))
+                level = None
         return
 
 
@@ -304,12 +383,14 @@ class WorkThief(MPIClass):
 
         curlen = len(self.queue)
 
-        split = int(curlen/4)
+        split = int(curlen*self.split_fraction)
+        if self.adaptive and curlen > self.excess_threshold:
+            # at least one, but keep excess_threshold for ourselves
+            split = max(1, min(split, curlen - self.excess_threshold))
 
         if split == 0: return None
 
-        front = self.queue[0:split]
-        self.queue  = self.queue[split:]
+        front = self.queue.popleft(split)
 
         assert (len(front) + len(self.queue)) == curlen, 'error splitting queue!'
 
@@ -321,20 +402,36 @@ class WorkThief(MPIClass):
     def progress(self,nsteps=1):
         step=0
         while self.queue and step < nsteps:
-            last = self.queue.pop() # separate from fn call to allow for lock
+            last = take(self.traversal, self.queue) # separate from fn call to allow for lock
             self.recurse(last, maxdepth=1)
             step += 1
         return
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def adaptive_progress(self):
+        # progress(1), feeding the scan time & queue growth to the adaptive
+        # controller and refreshing our thresholds every so often
+        ctl = self.adaptive
+        if not ctl: return self.progress(1)
+        n = len(self.queue)
+        t = MPI.Wtime()
+        self.progress(1)
+        if ctl.scanned(MPI.Wtime() - t, n, len(self.queue)):
+            (self.excess_threshold, self.starve_threshold,
+             self.max_requests_per_peer, self.split_fraction) = ctl.thresholds(len(self.queue))
+        return
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def execute(self):
 
         # intialiaze acounting & misc vals
-        my_size     = np.full(1, 1, dtype=np.int)
-        global_size = np.full(1, 1, dtype=np.int)
-        stole_from  = np.zeros(self.nranks, dtype=np.int)
+        my_size     = array('l', [1])
+        global_size = array('l', [1])
+        stole_from  = [0]*self.nranks
 
         all_done = False
         allreduce = None
@@ -348,7 +445,10 @@ class WorkThief(MPIClass):
 
         # how many outstanding work requests to allow
         max_outstanding_requests = 1
-        max_requests_per_peer = 10
+
+        # phase timers, if enabled.  't' is the start of the current lap
+        prof = self.profile
+        steal_start = None
 
         # double butffering for requests
         next_assign_requests = [MPI.REQUEST_NULL for p in range(0,self.nranks) ]
@@ -380,7 +480,7 @@ class WorkThief(MPIClass):
             barrier = None
             ready_for_barrier = False
             nbc_done = False
-            stole_from[:] = 0; stole_from[self.rank] = 1
+            stole_from[:] = [0]*self.nranks; stole_from[self.rank] = 1
 
 
 
@@ -392,10 +492,18 @@ class WorkThief(MPIClass):
                 total_loop += 1
                 recv_loop += 1
 
+                if prof:
+                    t = t_iter = MPI.Wtime()
+                    idle = not self.queue
+
 
 
                 # make progress on our own work
-                self.progress(1)
+                self.adaptive_progress()
+                if prof: t = prof.lap(prof.SCAN, t)
+
+                if self.telemetry: self.telemetry.poll()
+                self.poll_log()
 
 
 
@@ -403,11 +511,21 @@ class WorkThief(MPIClass):
                 if self.comm.iprobe(source=MPI.ANY_SOURCE,
                                     tag=self.tags['work_reply'],
                                     status=status):
+                    if prof: t = prof.lap(prof.PROBE, t)
                     recv_cnt += 1
-                    work = self.comm.recv(source=status.Get_source(),
-                                          tag=self.tags['work_reply'])
+                    victim = status.Get_source()
+                    work = unpack(self.comm.recv(source=victim,
+                                                 tag=self.tags['work_reply']))
 
-                    if work: self.queue.extend(work)
+                    if work:
+                        self.queue.extend(work)
+                        self.steal_hits += 1
+                        if self.adaptive: self.adaptive.work_received(MPI.Wtime(), victim)
+                        if prof and steal_start:
+                            prof.steal_latency(MPI.Wtime() - steal_start)
+                            steal_start = None
+                    if prof: t = prof.lap(prof.STEAL, t)
+                elif prof: t = prof.lap(prof.PROBE, t)
 
 
 
@@ -416,6 +534,7 @@ class WorkThief(MPIClass):
                 if self.comm.iprobe(source=MPI.ANY_SOURCE,
                                     tag=self.tags['work_request'],
                                     status=status):
+                    if prof: t = prof.lap(prof.PROBE, t)
                     source = status.Get_source()
                     n_msg_received += 1
                     ready_for_barrier = True
@@ -426,30 +545,29 @@ class WorkThief(MPIClass):
                         MPI.Request.Wait(next_assign_requests[source]) # should be a no-op
                         self.sendvals[source] = self.split_queue()
                         if self.sendvals[source]:
-                            label = " ***" if barrier else ""
-                            print("rank {:3d} satisfying {:3d}, loop (out,in,tot) = ({}, {}, {}){}".format(self.rank,
-                                                                                                           source,
-                                                                                                           outer_loop,
-                                                                                                           inner_loop,
-                                                                                                           total_loop,
-                                                                                                           label))
-                            next_assign_requests[source] = self.comm.issend(self.sendvals[source],
+                            self.log(self.LOG_DEBUG, "rank {:3d} satisfying {:3d}, loop (out,in,tot) = ({}, {}, {}){}",
+                                     self.rank, source, outer_loop, inner_loop, total_loop,
+                                     " ***" if barrier else "")
+                            next_assign_requests[source] = self.comm.issend(pack(self.sendvals[source]),
                                                                             dest=source,
                                                                             tag=self.tags['work_reply'])
 
                     recv_cnt += 1 # complete the receive, (empty message)
                     self.comm.recv(source=source,
                                    tag=self.tags['work_request'])
+                    if prof: t = prof.lap(prof.REPLY, t)
+                elif prof: t = prof.lap(prof.PROBE, t)
 
 
 
                 # Do I need more work?
                 if self.need_work():
                     stealrank = self.next_steal()
-                    if  ((stole_from[stealrank] < max_requests_per_peer) and
+                    if  ((stole_from[stealrank] < self.max_requests_per_peer) and
                          MPI.Request.Test(next_steal_requests[stealrank])):
                         stole_from[stealrank] += 1
                         n_msg_sent += 1
+                        self.steal_tries += 1
                         # label = " ***" if barrier else ""
                         # print("rank {:3d} requesing work from {:3d}{}".format(self.rank,
                         #                                                       stealrank,
@@ -457,6 +575,9 @@ class WorkThief(MPIClass):
                         next_steal_requests[stealrank] = self.comm.issend(None,
                                                                           dest=stealrank,
                                                                           tag=self.tags['work_request'])
+                        if prof and not steal_start: steal_start = MPI.Wtime()
+                        if self.adaptive: self.adaptive.request_sent(MPI.Wtime(), stealrank)
+                    if prof: t = prof.lap(prof.STEAL, t)
 
 
                 if ready_for_barrier:
@@ -472,6 +593,10 @@ class WorkThief(MPIClass):
                     # otherwise see if barrier completed
                     else:
                         nbc_done = MPI.Request.Test(barrier)
+                    if prof: t = prof.lap(prof.BARRIER, t)
+
+                # a lap with no local work to start with is idle time
+                if prof and idle: prof.add(prof.IDLE, t - t_iter)
 
                 # end NBC loop
                 #-------------
@@ -484,7 +609,9 @@ class WorkThief(MPIClass):
             # done with NBC, we are at a consistent state across ranks.
             # wait on previous reduciton, if any
             if allreduce:
+                if prof: t = MPI.Wtime()
                 MPI.Request.Wait(allreduce)
+                if prof: prof.lap(prof.BARRIER, t)
                 allreduce = None
                 all_done = False if global_size[0] else True
 
@@ -502,6 +629,8 @@ class WorkThief(MPIClass):
         # complete
         tstop = MPI.Wtime()
 
+        if self.telemetry: self.telemetry.finalize()
+
         max_steps = self.comm.allreduce(total_loop, MPI.MAX)
 
         # idx, flag, msg = MPI.Request.testany(self.assign_requests)
@@ -531,14 +660,122 @@ class WorkThief(MPIClass):
 
 
         # sanity checks
-        assert outer_loop is self.comm.allreduce(outer_loop, MPI.MAX), "Inconsistent outer_loop count??"
-        assert outer_loop is self.comm.allreduce(outer_loop, MPI.MIN), "Inconsistent outer_loop count??"
+        assert outer_loop == self.comm.allreduce(outer_loop, MPI.MAX), "Inconsistent outer_loop count??"
+        assert outer_loop == self.comm.allreduce(outer_loop, MPI.MIN), "Inconsistent outer_loop count??"
         #print(self.file_size, self.st_modes)
 
         return
 
 
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    def execute_rma(self):
+        # one-sided variant of execute(): surplus work is published in an
+        # MPI window and idle ranks take it without the owner's involvement,
+        # termination when the global pending directory count drops to zero
+        from rmaqueue import RMAQueue
+
+        prof = self.profile
+        total_loop = 0
+        n_published = 0
+        n_checks = 0
+        misses = 0
+        all_done = (self.nranks == 1)
+
+        rq = RMAQueue(self.comm,
+                      nslots=self.get_option('rma_slots', 4096),
+                      arena=self.get_option('rma_arena', 4*1024*1024),
+                      pending=len(self.queue))
+
+        tstart = MPI.Wtime()
+
+        # single rank: no one to share with
+        while self.nranks == 1 and self.queue:
+            self.progress(10**9)
+
+        while not all_done:
+
+            total_loop += 1
+            if prof:
+                t = t_iter = MPI.Wtime()
+                idle = not self.queue
+
+            # make progress on our own work, counting directories
+            # discovered less the one scanned
+            n = len(self.queue)
+            self.adaptive_progress()
+            rq.discovered(len(self.queue) - n)
+            if prof: t = prof.lap(prof.SCAN, t)
+
+            if self.telemetry: self.telemetry.poll()
+            self.poll_log()
+
+            # offer surplus from the front of the queue, if what we
+            # offered last time is gone
+            if self.excess_work():
+                front = self.split_queue()
+                if front:
+                    n = rq.publish(front)
+                    self.queue.appendleft(front[n:])
+                    if n: n_published += 1
+                if prof: t = prof.lap(prof.REPLY, t)
+
+            # out of work: take back our own, then steal
+            if self.need_work():
+                work = rq.reclaim()
+                if not work:
+                    self.steal_tries += 1
+                    victim = self.next_steal()
+                    if self.adaptive: self.adaptive.request_sent(MPI.Wtime(), victim)
+                    work = rq.steal(victim)
+                    if work:
+                        self.steal_hits += 1
+                        if self.adaptive: self.adaptive.work_received(MPI.Wtime(), victim)
+                    elif self.adaptive:
+                        self.adaptive.request_missed(victim)
+                if work:
+                    self.queue.extend(work)
+                    misses = 0
+                else:
+                    misses += 1
+                if prof: t = prof.lap(prof.STEAL, t)
+
+                # after a fruitless round of all peers, check for termination
+                if misses >= self.nranks-1:
+                    misses = 0
+                    n_checks += 1
+                    all_done = (rq.sync_pending() == 0)
+                    if prof: t = prof.lap(prof.BARRIER, t)
+
+            if prof and idle: prof.add(prof.IDLE, t - t_iter)
+
+        tstop = MPI.Wtime()
+        lock_fails = rq.lock_fails
+        rq.free()
+
+        if self.telemetry: self.telemetry.finalize()
+
+        max_steps = self.comm.allreduce(total_loop, MPI.MAX)
+
+        self.comm.Barrier()
+        sys.stdout.flush()
+        # print end message
+        for p in range(0,self.nranks):
+            self.comm.Barrier()
+            sys.stdout.flush()
+            if p == self.rank:
+                if self.i_am_root:
+                    print("-"*80)
+                    print("Completed in {:4f} seconds on {} ranks (one-sided), max {} steps".format(tstop-tstart,
+                                                                                                  self.nranks,
+                                                                                                  max_steps))
+                    print("-"*80)
+                print("-r-> rank {:3d} stole {}/{}, published {}, {} lock conflicts, {} termination checks in {:6d} total steps".format(
+                    self.rank, self.steal_hits, self.steal_tries, n_published, lock_fails, n_checks, total_loop))
+        return
+
+
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     def run_serial_task(self):
         return
@@ -550,7 +787,17 @@ class WorkThief(MPIClass):
         #self.process()
         self.comm.Barrier()
         sys.stdout.flush()
-        self.execute()
+        self.init_telemetry()
+        self.init_profile()
+        if self.profile: self.profile.start()
+        # 'steal' : 'msg' (two-sided requests & replies) or 'rma' (one-sided)
+        if self.get_option('steal', 'msg') == 'rma':
+            self.execute_rma()
+        else:
+            self.execute()
+        if self.profile: self.profile.stop()
+        self.queue.close()
+        if self.lister: self.lister.close()
         return
 
 
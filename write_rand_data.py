@@ -1,27 +1,59 @@
 #!/usr/bin/env python
 
 import socket
+import os
+
+# reusable random buffers, keyed by content type.  generated once per
+# process and sliced for each file, see rand_buffer()
+_buffers = {}
+
+def rand_buffer(size, compressible=False):
+    """ Return a memoryview of at least 2*size bytes of random content,
+    reusing (or growing) a buffer kept for the life of the process.
+    'compressible' content is drawn from a 16 letter alphabet (roughly 2:1
+    with gzip), otherwise it is uniformly random bytes.
+    """
+
+    buf = _buffers.get(compressible)
+    if buf is None or len(buf) < 2*size:
+        import numpy as np
+        rng = np.random.default_rng()
+        if compressible:
+            data = rng.integers(ord('a'), ord('a')+16, size=2*size, dtype=np.uint8).tobytes()
+        else:
+            data = rng.bytes(2*size)
+        buf = _buffers[compressible] = memoryview(data)
+    return buf
+
+
 
 def write_rand_data( min_num_files=10, max_num_files=30, min_size_pow=1,
-                     max_size_pow=6):
+                     max_size_pow=6, nthreads=1, compressible=False, dirname='.'):
     """ Create a random number of files of random size.  The number of files
     is bracketed by [min_num_files, max_num_files] and the size of the
     files is bracketed by 10**[min_size_pow, max_size_pow] bytes.
 
     Default maximum size, therefore, is 10e6 bytes.
+
+    File contents are zero-copy slices, at random offsets, of one reusable
+    buffer (see rand_buffer), so the cost is in the writes rather than in
+    generating data.  With nthreads > 1 the files are written concurrently.
+    Files and summary.txt are created in 'dirname'.
     """
 
     from random import randint
-    from os import urandom
+
+    buf = rand_buffer(10**max_size_pow, compressible)
 
     n_files = randint( min_num_files, max_num_files )
     total_size = 0
+    files = []
     for i in range( n_files ):
 
-        ### Generate random data
+        ### Pick a random slice of the data buffer
         file_size = 10**randint( min_size_pow, max_size_pow )
         total_size += file_size
-        data = urandom( file_size )
+        offset = randint( 0, len(buf) - file_size )
 
         ### Name the file -- include the expected file size in the name
         if file_size >=1024000:
@@ -34,14 +66,24 @@ def write_rand_data( min_num_files=10, max_num_files=30, min_size_pow=1,
             # Measured in b -- "B" in linux
             size_string = '{:d}B'.format( file_size )
 
-        file_name = 'f{:03d}.{:s}.dat'.format( i, size_string )
+        file_name = os.path.join( dirname, 'f{:03d}.{:s}.dat'.format( i, size_string ) )
+        files.append( (file_name, buf[offset:offset+file_size]) )
 
-        ### Write the data
+    ### Write the data
+    def write( item ):
+        file_name, data = item
         with open( file_name, 'wb' ) as f:
             f.write( data )
 
+    if nthreads > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor( max_workers=nthreads ) as pool:
+            list( pool.map( write, files ) )
+    else:
+        for item in files: write( item )
+
     # write summary file
-    with open ('summary.txt', 'w') as out:
+    with open (os.path.join(dirname, 'summary.txt'), 'w') as out:
         hn=socket.gethostname()
         out.write("{} wrote {} files\n".format(hn, n_files))
         out.write("{} wrote {} bytes\n".format(hn, total_size))
@@ -49,5 +91,19 @@ def write_rand_data( min_num_files=10, max_num_files=30, min_size_pow=1,
 
 
 
+def write_step( topdir, step, nthreads=1, compressible=False ):
+    """ One task of the task runner: random files in a new directory
+    'topdir'/'step'.  A plain function, so pool workers (threads, or
+    processes) can run it.  Returns the seconds it took. """
+
+    import time
+    tstart = time.time()
+    stepdir = os.path.join( topdir, step )
+    os.mkdir( stepdir )
+    write_rand_data( nthreads=nthreads, compressible=compressible, dirname=stepdir )
+    return time.time() - tstart
+
+
+
 if __name__ == '__main__':
     write_rand_data()